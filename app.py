@@ -4,88 +4,370 @@ This module implements the Flask web application for BrokerBuddy,
 focusing on the core matchmaking functionality between clients and lenders.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, flash, session, g
 import os
 import sqlite3
 from datetime import datetime
 import sys
-import logging
 
 # Add the current directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database_schema import BrokerBuddyDB
-from matching_engine import MatchingEngine
+from app_logging import SampledFilter, configure_logging
+from asset_pipeline import DIST_NAME, AssetManifest, send_built_asset
+from database_schema import BrokerBuddyDB, ConnectionPool, ensure_client_columns, resolve_pragmas
+from lender_catalog import LenderCatalog
+from match_jobs import JOB_FAILED, MatchJobRunner, enqueue_job, get_job_status
+from match_api import APIError, json_response, parse_fields, parse_limit, read_json, serialize_match
+from matching_engine import DeferredMatchWriter, MatchingEngine
+from page_cache import CachedPage, PageCache, make_etag, parse_timestamp
+from request_metrics import NULL_METRICS, MetricsRegistry, RequestMetrics, activate, count_query, deactivate
+from result_store import MatchResultStore
+from scoring_rules import load_rule_set
 
 # Create Flask application
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'brokerbuddy_simplified_secret_key')
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-handler = logging.StreamHandler(sys.stdout)
-handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-app.logger.addHandler(handler)
-app.logger.setLevel(logging.DEBUG)
-
 # Configuration
 app.config.update(
     DATABASE_PATH=os.environ.get('DATABASE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brokerbuddy.db')),
     DEBUG=False, # Temporarily set to False
-    TESTING=False
+    TESTING=False,
+    # Keep compiled lenders in memory per worker instead of reloading them on every match
+    LENDER_CATALOG_CACHE=os.environ.get('LENDER_CATALOG_CACHE', '1') != '0',
+    # Score the whole catalog with NumPy arrays (falls back to the per-lender loop without NumPy)
+    MATCHING_VECTORIZED=os.environ.get('MATCHING_VECTORIZED', '1') != '0',
+    # Keep only the best N matches (0 keeps every match); a limit also caps what
+    # is saved, stored and returned by /api/match, so deployments opt in
+    MATCH_RESULT_LIMIT=int(os.environ.get('MATCH_RESULT_LIMIT', 0)),
+    MATCH_MIN_SCORE=float(os.environ.get('MATCH_MIN_SCORE', 0)),
+    # Drop lenders failing a knockout criterion (credit score or time in business floors by default)
+    # before scoring the rest; knocked out lenders are only counted
+    MATCH_KNOCKOUT=os.environ.get('MATCH_KNOCKOUT', '0') == '1',
+    # JSON file of scoring rules (see scoring_rules.py); the built-in rules are used without one
+    SCORING_RULES_PATH=os.environ.get('SCORING_RULES_PATH', ''),
+    # Per-worker SQLite connection pool; size it to at least the number of worker threads
+    DB_POOL_SIZE=int(os.environ.get('DB_POOL_SIZE', 5)),
+    DB_POOL_TIMEOUT=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    # SQLite settings for every connection: a profile from database_schema.PRAGMA_PROFILES,
+    # plus optional per-pragma overrides (e.g. {'busy_timeout': 10000})
+    DATABASE_PRAGMA_PROFILE=os.environ.get('DATABASE_PRAGMA_PROFILE', 'performance'),
+    DATABASE_PRAGMAS={},
+    # 'sync' saves match rows before responding; 'deferred' hands them to a background writer
+    MATCH_SAVE_MODE=os.environ.get('MATCH_SAVE_MODE', 'sync'),
+    # Server-side match results kept per worker; the session only holds the client_id
+    RESULT_STORE_SIZE=int(os.environ.get('RESULT_STORE_SIZE', 1000)),
+    RESULT_STORE_TTL=int(os.environ.get('RESULT_STORE_TTL', 3600)),
+    # Largest request body in bytes; /api/match also applies it to a gzip body after decompressing
+    MAX_CONTENT_LENGTH=int(os.environ.get('MAX_CONTENT_LENGTH', 1024 * 1024)),
+    # Largest `limit` and number of clients accepted by POST /api/match
+    MATCH_API_MAX_LIMIT=int(os.environ.get('MATCH_API_MAX_LIMIT', 100)),
+    MATCH_API_MAX_BATCH=int(os.environ.get('MATCH_API_MAX_BATCH', 100)),
+    # Per-request timing spans, counters and query counts, served at /metrics
+    METRICS_ENABLED=os.environ.get('METRICS_ENABLED', '0') == '1',
+    # Also send each request's stage timings back in a Server-Timing header
+    SERVER_TIMING=os.environ.get('SERVER_TIMING', '0') == '1',
+    # Rendered /lender-details pages kept per worker (0 disables); needs LENDER_CATALOG_CACHE
+    LENDER_PAGE_CACHE_SIZE=int(os.environ.get('LENDER_PAGE_CACHE_SIZE', 512)),
+    # Render the landing, signup and error pages once per worker instead of on every request
+    STATIC_PAGE_CACHE=os.environ.get('STATIC_PAGE_CACHE', '1') != '0',
+    # How long browsers and proxies may reuse those pages before revalidating
+    STATIC_PAGE_MAX_AGE=int(os.environ.get('STATIC_PAGE_MAX_AGE', 300)),
+    # Link fingerprinted assets from static/dist when `python asset_pipeline.py` has built them
+    ASSET_FINGERPRINTS=os.environ.get('ASSET_FINGERPRINTS', '1') != '0',
+    # Log level for the app and libraries (DEBUG, INFO, WARNING, ...)
+    LOG_LEVEL=os.environ.get('LOG_LEVEL', 'INFO'),
+    # 'text' for human-readable lines, 'json' for one JSON object per line
+    LOG_FORMAT=os.environ.get('LOG_FORMAT', 'text'),
+    # Write log lines from a background thread instead of the request thread
+    LOG_ASYNC=os.environ.get('LOG_ASYNC', '0') == '1',
+    # Fraction of client submissions whose debug lines are logged, when LOG_LEVEL is DEBUG
+    LOG_DEBUG_SAMPLE_RATE=float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 1.0)),
+    # 'sync' matches a submission before redirecting; 'async' queues a match job and
+    # /find-lenders waits for it (MATCH_SAVE_MODE does not apply to jobs)
+    MATCH_PIPELINE=os.environ.get('MATCH_PIPELINE', 'sync'),
+    # Background threads running match jobs in each worker
+    MATCH_JOB_WORKERS=int(os.environ.get('MATCH_JOB_WORKERS', 2)),
+    # Seconds between checks for jobs no runner has taken, e.g. from a worker that exited
+    MATCH_JOB_POLL_INTERVAL=float(os.environ.get('MATCH_JOB_POLL_INTERVAL', 5)),
+    # Seconds after which a job still marked running is assumed lost and run again
+    MATCH_JOB_STALE_AFTER=int(os.environ.get('MATCH_JOB_STALE_AFTER', 300))
 )
 
+# Configure logging: one root handler, so each line is written once
+async_logging = configure_logging(app)
+# Debug lines from client submissions, sampled by LOG_DEBUG_SAMPLE_RATE
+submit_logger = app.logger.getChild('submit')
+submit_logger.addFilter(SampledFilter(app.config['LOG_DEBUG_SAMPLE_RATE']))
+
 # Ensure session directory exists
 session_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flask_session')
 if not os.path.exists(session_dir):
     os.makedirs(session_dir)
 app.config['SESSION_FILE_DIR'] = session_dir
 
-# Database connection helper
+def get_db_pragmas():
+    return resolve_pragmas(app.config['DATABASE_PRAGMA_PROFILE'], app.config['DATABASE_PRAGMAS'])
+
+# Per-worker connection pool, created lazily (and again after a fork) so workers never share connections
+_db_pool = None
+
+def get_db_pool():
+    global _db_pool
+    db_path = app.config['DATABASE_PATH']
+    if _db_pool is None or _db_pool.db_path != db_path or _db_pool.pid != os.getpid():
+        _db_pool = ConnectionPool(
+            db_path,
+            size=app.config['DB_POOL_SIZE'],
+            timeout=app.config['DB_POOL_TIMEOUT'],
+            pragmas=get_db_pragmas()
+        )
+        # Databases created before interested_in_wc was stored need the column before clients are saved
+        conn = _db_pool.acquire()
+        try:
+            ensure_client_columns(conn)
+        finally:
+            _db_pool.release(conn)
+    return _db_pool
+
+# Database connection helper; one pooled connection per request, returned on teardown
 def get_db():
+    if 'db' in g:
+        return g.db
     try:
         db_path = app.config['DATABASE_PATH']
-        app.logger.debug(f"Connecting to database at {db_path}")
-        db = BrokerBuddyDB(db_path)
+        app.logger.debug("Acquiring database connection for %s", db_path)
+        db = BrokerBuddyDB(db_path, pool=get_db_pool())
         db.connect()
+        if app.config['METRICS_ENABLED']:
+            db.conn.set_trace_callback(count_query)
+        g.db = db
         return db
     except Exception as e:
-        app.logger.error(f"Error connecting to database: {str(e)}")
+        app.logger.error("Error connecting to database: %s", e)
         raise
 
+@app.teardown_appcontext
+def close_db(exception):
+    db = g.pop('db', None)
+    if db is not None:
+        if app.config['METRICS_ENABLED']:
+            db.conn.set_trace_callback(None)
+        db.close()
+
+# Per-worker metrics; requests are only instrumented when METRICS_ENABLED is set
+metrics_registry = MetricsRegistry()
+
+def request_metrics():
+    """The current request's RequestMetrics, or a no-op stand-in when disabled."""
+    return g.get('metrics', NULL_METRICS)
+
+@app.before_request
+def start_request_metrics():
+    if app.config['METRICS_ENABLED']:
+        g.metrics = RequestMetrics()
+        g.metrics_token = activate(g.metrics)
+
+@app.after_request
+def record_request_metrics(response):
+    metrics = g.get('metrics')
+    if metrics is not None:
+        metrics_registry.record_request(request.endpoint or 'unknown', request.method, response.status_code, metrics)
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = metrics.server_timing()
+    return response
+
+@app.teardown_request
+def stop_request_metrics(exception):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        deactivate(token)
+
+@app.route('/metrics')
+def metrics():
+    if not app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+# Per-worker lender catalog, created lazily so each gunicorn worker opens its own connection
+_lender_catalog = None
+
+def get_lender_catalog():
+    global _lender_catalog
+    if not app.config['LENDER_CATALOG_CACHE']:
+        return None
+    if _lender_catalog is None or _lender_catalog.db_path != app.config['DATABASE_PATH']:
+        _lender_catalog = LenderCatalog(
+            app.config['DATABASE_PATH'],
+            pragmas=get_db_pragmas(),
+            trace_callback=count_query if app.config['METRICS_ENABLED'] else None
+        )
+    return _lender_catalog
+
+# Scoring rules, loaded once per worker
+_scoring_rules = None
+
+def get_scoring_rules():
+    global _scoring_rules
+    path = app.config['SCORING_RULES_PATH']
+    if _scoring_rules is None or _scoring_rules[0] != path:
+        _scoring_rules = (path, load_rule_set(path))
+    return _scoring_rules[1]
+
+def build_matching_engine(conn):
+    return MatchingEngine(
+        conn,
+        catalog=get_lender_catalog(),
+        vectorized=app.config['MATCHING_VECTORIZED'],
+        limit=app.config['MATCH_RESULT_LIMIT'] or None,
+        min_score=app.config['MATCH_MIN_SCORE'],
+        rules=get_scoring_rules(),
+        knockout=app.config['MATCH_KNOCKOUT']
+    )
+
 # Get matching engine
 def get_matching_engine():
     try:
         db = get_db()
-        return MatchingEngine(db.conn)
+        return build_matching_engine(db.conn)
     except Exception as e:
-        app.logger.error(f"Error creating matching engine: {str(e)}")
+        app.logger.error("Error creating matching engine: %s", e)
         raise
 
+# Per-worker background writer for MATCH_SAVE_MODE='deferred', created again after a fork
+_match_writer = None
+
+def get_match_writer():
+    global _match_writer
+    if (_match_writer is None or _match_writer.db_path != app.config['DATABASE_PATH']
+            or _match_writer.pid != os.getpid()):
+        _match_writer = DeferredMatchWriter(app.config['DATABASE_PATH'], pragmas=get_db_pragmas())
+    return _match_writer
+
+def match_job_done(client_id, client_data, matches, seconds):
+    # Keep the results in this worker's store; other workers load them from the database
+    get_result_store().put(client_id, client_data, matches)
+    if app.config['METRICS_ENABLED']:
+        metrics_registry.observe('match_job_duration_seconds', seconds)
+
+# Per-worker runner for MATCH_PIPELINE='async', created lazily (and again after a fork)
+_match_job_runner = None
+
+def get_match_job_runner():
+    global _match_job_runner
+    db_path = app.config['DATABASE_PATH']
+    if _match_job_runner is None or _match_job_runner.db_path != db_path or _match_job_runner.pid != os.getpid():
+        _match_job_runner = MatchJobRunner(
+            db_path,
+            build_matching_engine,
+            pragmas=get_db_pragmas(),
+            workers=app.config['MATCH_JOB_WORKERS'],
+            poll_interval=app.config['MATCH_JOB_POLL_INTERVAL'],
+            stale_after=app.config['MATCH_JOB_STALE_AFTER'],
+            on_done=match_job_done
+        )
+    return _match_job_runner
+
+# Per-worker match result store, backed by the clients and matches tables
+_result_store = None
+
+def get_result_store():
+    global _result_store
+    if _result_store is None:
+        _result_store = MatchResultStore(size=app.config['RESULT_STORE_SIZE'], ttl=app.config['RESULT_STORE_TTL'])
+    return _result_store
+
+# Per-worker cache of rendered lender detail pages
+_lender_page_cache = None
+
+def get_lender_page_cache():
+    global _lender_page_cache
+    if _lender_page_cache is None:
+        _lender_page_cache = PageCache(size=app.config['LENDER_PAGE_CACHE_SIZE'])
+    return _lender_page_cache
+
+# Per-worker view of the static/dist build manifest
+asset_manifest = AssetManifest(app.static_folder)
+
+def asset_version():
+    """Version of the asset build, part of cached pages' keys since they link its URLs."""
+    return asset_manifest.refresh() if app.config['ASSET_FINGERPRINTS'] else None
+
+def asset_url(filename):
+    """url_for('static') for templates, pointing at the fingerprinted build when there is one."""
+    if not app.config['ASSET_FINGERPRINTS']:
+        return url_for('static', filename=filename)
+    return asset_manifest.url(filename)
+
+def asset_srcset(filename, ext=None):
+    """srcset of an image's built widths ('' without a build); ext='.webp' lists the WebP copies."""
+    if not app.config['ASSET_FINGERPRINTS']:
+        return ''
+    return asset_manifest.srcset(filename, ext)
+
+app.jinja_env.globals.update(asset_url=asset_url, asset_srcset=asset_srcset)
+
+@app.route('/static/dist/<path:filename>')
+def built_asset(filename):
+    return send_built_asset(os.path.join(app.static_folder, DIST_NAME), filename, request)
+
+def template_version(name):
+    """Modification time of a template, so cached pages' ETags change on deploy."""
+    return os.path.getmtime(os.path.join(app.root_path, app.template_folder, name))
+
+# Per-worker cache of pages that only depend on their template and the footer year
+_static_page_cache = PageCache(size=64)
+
+def static_page(template, status=200, cache_control=None, fresh=False):
+    """Serve a template that needs nothing but `now`, rendering it once per worker.
+
+    Pages are keyed by template, year (for the footer) and the asset build
+    whose URLs they link.
+    Responses carry an ETag (200s also answer conditional requests with 304)
+    and `cache_control`, by default public for STATIC_PAGE_MAX_AGE seconds.
+    `fresh` renders this request's page without the cache.
+    """
+    if cache_control is None:
+        cache_control = f"public, max-age={app.config['STATIC_PAGE_MAX_AGE']}"
+    now = datetime.now()
+    if fresh or not app.config['STATIC_PAGE_CACHE']:
+        response = app.make_response((render_template(template, now=now), status))
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    key = (template, now.year, asset_version())
+    page = _static_page_cache.get(key)
+    if page is None:
+        page = CachedPage(render_template(template, now=now), make_etag(key, template_version(template)))
+        _static_page_cache.put(key, page)
+    return page.response(request, cache_control, status)
+
 # Initialize database if it doesn't exist
 def init_db():
     try:
         if not os.path.exists(app.config['DATABASE_PATH']):
-            app.logger.info(f"Initializing database at {app.config['DATABASE_PATH']}")
+            app.logger.info("Initializing database at %s", app.config['DATABASE_PATH'])
             db = BrokerBuddyDB(app.config['DATABASE_PATH'])
             db.initialize_database()
-            app.logger.info(f"Database initialized at {app.config['DATABASE_PATH']}")
+            app.logger.info("Database initialized at %s", app.config['DATABASE_PATH'])
     except Exception as e:
-        app.logger.error(f"Error initializing database: {str(e)}")
+        app.logger.error("Error initializing database: %s", e)
         raise
 
 @app.route('/client-form')
 def client_form():
-    return render_template('client_form.html', now=datetime.now())
+    # The form shows flashed messages, so it is rendered fresh when any are pending,
+    # and revalidated on every view so a browser never reuses a copy without them
+    return static_page('client_form.html', cache_control='private, no-cache', fresh=bool(session.get('_flashes')))
 
 @app.route('/submit-client', methods=['POST'])
 def submit_client():
     if request.method == 'POST':
         try:
-            app.logger.debug("Processing client form submission")
-            app.logger.debug(f"Form data: {request.form}")
+            submit_logger.debug("Processing client form submission")
+            metrics = request_metrics()
+            submit_logger.debug("Form data: %s", request.form)
 
             client_data = {
                 'business_name': request.form.get('business_name', ''),
@@ -96,90 +378,166 @@ def submit_client():
                 'equipment_type': request.form.get('equipment_type', ''),
                 'equipment_cost': request.form.get('equipment_cost', ''),
                 'notes': request.form.get('notes', ''),
-                'interested_in_wc': request.form.get('interested_in_wc', '')  # 🆕 Added
+                'interested_in_wc': request.form.get('needs_working_capital', request.form.get('interested_in_wc', ''))
             }
 
-            app.logger.debug(f"Processed client data: {client_data}")
+            submit_logger.debug("Processed client data: %s", client_data)
 
             required_fields = ['business_name', 'credit_score', 'time_in_business', 'equipment_type', 'equipment_cost']
             for field in required_fields:
                 if not client_data[field]:
-                    app.logger.warning(f"Missing required field: {field}")
+                    app.logger.warning("Missing required field: %s", field)
                     flash(f"Please provide {field.replace('_', ' ').title()}")
                     return redirect(url_for('client_form'))
 
+            pipeline_async = app.config['MATCH_PIPELINE'] == 'async'
+            matches = None
             try:
-                db = get_db()
-                cursor = db.conn.cursor()
-
-                app.logger.debug("Inserting client data into database")
-                cursor.execute('''
-                INSERT INTO clients (
-                    business_name, credit_score, time_in_business, monthly_revenue,
-                    equipment_type, equipment_cost, industry, notes, created_at, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    client_data['business_name'],
-                    client_data['credit_score'],
-                    client_data['time_in_business'],
-                    client_data['monthly_revenue'],
-                    client_data['equipment_type'],
-                    client_data['equipment_cost'],
-                    client_data['industry'],
-                    client_data['notes'],
-                    datetime.now().isoformat(),
-                    datetime.now().isoformat()
-                ))
-
-                client_id = cursor.lastrowid
-                app.logger.debug(f"Client inserted with ID: {client_id}")
-                db.conn.commit()
+                with metrics.span('db_insert'):
+                    db = get_db()
+                    if pipeline_async:
+                        # Creates the match_jobs table before the job is added below
+                        job_runner = get_match_job_runner()
+                    cursor = db.conn.cursor()
+
+                    submit_logger.debug("Inserting client data into database")
+                    cursor.execute('''
+                    INSERT INTO clients (
+                        business_name, credit_score, time_in_business, monthly_revenue,
+                        equipment_type, equipment_cost, industry, notes, interested_in_wc,
+                        created_at, updated_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        client_data['business_name'],
+                        client_data['credit_score'],
+                        client_data['time_in_business'],
+                        client_data['monthly_revenue'],
+                        client_data['equipment_type'],
+                        client_data['equipment_cost'],
+                        client_data['industry'],
+                        client_data['notes'],
+                        client_data['interested_in_wc'],
+                        datetime.now().isoformat(),
+                        datetime.now().isoformat()
+                    ))
+
+                    client_id = cursor.lastrowid
+                    submit_logger.debug("Client inserted with ID: %s", client_id)
+                    if pipeline_async:
+                        # In the same transaction, so a saved client always has its job
+                        enqueue_job(db.conn, client_id, client_data)
+                    db.conn.commit()
             except Exception as e:
-                app.logger.error(f"Error saving client to database: {str(e)}")
+                app.logger.error("Error saving client to database: %s", e)
                 flash("An error occurred while saving your client information. Please try again.")
                 return redirect(url_for('client_form'))
 
-            try:
-                app.logger.debug("Finding matching lenders")
-                matching_engine = get_matching_engine()
-                matches = matching_engine.find_matching_lenders(client_data)
-                app.logger.debug(f"Found {len(matches)} matching lenders")
-
-                matching_engine.save_match_results(client_id, matches)
-                app.logger.debug("Saved match results to database")
-            except Exception as e:
-                app.logger.error(f"Error in matching engine: {str(e)}")
-                flash("An error occurred while finding matching lenders. Please try again.")
-                return redirect(url_for('client_form'))
+            if pipeline_async:
+                # Matched by a background thread; /find-lenders waits for the job
+                job_runner.submit(client_id)
+                submit_logger.debug("Queued match job")
+            else:
+                try:
+                    submit_logger.debug("Finding matching lenders")
+                    with metrics.span('catalog'):
+                        matching_engine = get_matching_engine()
+                        # Load (or refresh) the catalog up front so scoring is timed on its own
+                        if matching_engine.catalog is not None:
+                            matching_engine.catalog.get_lenders()
+                    with metrics.span('scoring'):
+                        matches = matching_engine.find_matching_lenders(client_data)
+                    submit_logger.debug("Found %s matching lenders", len(matches))
+                    metrics.count('lenders_scanned', matching_engine.lenders_scanned)
+                    if matching_engine.knockouts:
+                        submit_logger.debug("Knocked out lenders by criterion: %s", dict(matching_engine.knockouts))
+                        for criterion, count in matching_engine.knockouts.items():
+                            metrics.count('lenders_knocked_out', count, criterion=criterion)
+
+                    with metrics.span('match_save'):
+                        if app.config['MATCH_SAVE_MODE'] == 'deferred':
+                            get_match_writer().submit(client_id, matches)
+                            submit_logger.debug("Queued match results for saving")
+                        else:
+                            matching_engine.save_match_results(client_id, matches)
+                            submit_logger.debug("Saved match results to database")
+                except Exception as e:
+                    app.logger.error("Error in matching engine: %s", e)
+                    flash("An error occurred while finding matching lenders. Please try again.")
+                    return redirect(url_for('client_form'))
 
             try:
-                session['client_id'] = client_id
-                session['client_data'] = client_data
-                session['matches'] = matches
-                app.logger.debug("Stored client data and matches in session")
+                with metrics.span('session'):
+                    if matches is not None:
+                        get_result_store().put(client_id, client_data, matches)
+                    session['client_id'] = client_id
+                    # Drop results stored in the cookie by earlier versions
+                    session.pop('client_data', None)
+                    session.pop('matches', None)
+                submit_logger.debug("Stored match results and client_id in session")
             except Exception as e:
-                app.logger.error(f"Error storing data in session: {str(e)}")
+                app.logger.error("Error storing data in session: %s", e)
                 flash("An error occurred while processing your request. Please try again.")
                 return redirect(url_for('client_form'))
 
             return redirect(url_for('find_lenders'))
         except Exception as e:
-            app.logger.error(f"Unexpected error in submit_client: {str(e)}")
+            app.logger.error("Unexpected error in submit_client: %s", e)
             flash("An unexpected error occurred. Please try again later.")
             return redirect(url_for('client_form'))
 
+def pending_match_job(client_id):
+    """(status, error) of a client's unfinished match job in async mode, else None."""
+    if app.config['MATCH_PIPELINE'] != 'async':
+        return None
+    # Starts this worker's runner, which also creates the match_jobs table
+    get_match_job_runner()
+    return get_job_status(get_db().conn, client_id)
+
+@app.route('/find-lenders/status')
+def find_lenders_status():
+    """Report whether the session's matches are ready, for the waiting page to poll."""
+    client_id = session.get('client_id')
+    if not client_id:
+        status = 'none'
+    else:
+        job = pending_match_job(client_id)
+        status = job[0] if job is not None else 'done'
+    response = json_response({'status': status}, request)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.route('/find-lenders')
 def find_lenders():
     """Display matching lenders for the client."""
     try:
+        metrics = request_metrics()
         client_id = session.get('client_id')
-        client_data = session.get('client_data')
-        matches = session.get('matches')
-        
-        app.logger.debug(f"Retrieved from session - client_id: {client_id}, matches: {len(matches) if matches else 0}")
+        job = None
+        with metrics.span('results'):
+            store = get_result_store()
+            result = store.get(client_id) if client_id else None
+            if result is None and client_id:
+                job = pending_match_job(client_id)
+                if job is None:
+                    result = store.get(client_id, get_db().conn)
+
+        if job is not None:
+            status, error = job
+            if status == JOB_FAILED:
+                app.logger.error("Match job failed for client %s: %s", client_id, error)
+                flash("An error occurred while finding matching lenders. Please try again.")
+                return redirect(url_for('client_form'))
+            # Still matching; the page polls /find-lenders/status and reloads when done
+            response = app.make_response((render_template('match_pending.html', now=datetime.now()), 202))
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+
+        client_data, matches = result if result else (None, None)
+
+        app.logger.debug("Retrieved results - client_id: %s, matches: %s", client_id, len(matches) if matches else 0)
 
         if not client_id or not matches:
-            app.logger.warning("No client data or matches found in session")
+            app.logger.warning("No client data or matches found for session")
             flash("Please submit client information first")
             return redirect(url_for('client_form'))
 
@@ -199,56 +557,136 @@ def find_lenders():
             else:
                 equipment_matches.append(match)
 
-        return render_template('results.html', 
-            client_data=client_data, 
-            equipment_matches=equipment_matches,
-            working_capital_matches=working_capital_matches,
-            now=datetime.now()
-        )
+        with metrics.span('render'):
+            return render_template('results.html', 
+                client_data=client_data, 
+                matches=matches,
+                equipment_matches=equipment_matches,
+                working_capital_matches=working_capital_matches,
+                now=datetime.now()
+            )
     except Exception as e:
-        app.logger.error(f"Error in find_lenders: {str(e)}")
+        app.logger.error("Error in find_lenders: %s", e)
         flash("An error occurred while retrieving lender matches. Please try again.")
         return redirect(url_for('client_form'))
 
+@app.route('/api/match', methods=['POST'])
+def api_match():
+    """Match client JSON against the lender catalog and return the ranked matches.
+
+    The body is a client object, or {"clients": [...]} for a batch. Optional
+    `limit` and `fields` parameters are read from the query string or the
+    body. Clients are matched but not saved.
+    """
+    try:
+        payload = read_json(request)
+        if not isinstance(payload, dict):
+            raise APIError("Request body must be a JSON object")
+        batch = 'clients' in payload
+        clients = payload['clients'] if batch else [payload]
+        if not isinstance(clients, list) or not all(isinstance(client, dict) for client in clients):
+            raise APIError("clients must be a list of JSON objects")
+        if len(clients) > app.config['MATCH_API_MAX_BATCH']:
+            raise APIError(f"At most {app.config['MATCH_API_MAX_BATCH']} clients can be matched per request")
+
+        limit = parse_limit(request.args.get('limit', payload.get('limit')), app.config['MATCH_API_MAX_LIMIT'])
+        fields = parse_fields(request.args.get('fields', payload.get('fields')))
+
+        metrics = request_metrics()
+        matching_engine = get_matching_engine()
+        with metrics.span('scoring'):
+            if batch:
+                results = [
+                    {'matches': [serialize_match(match, fields) for match in matches]}
+                    for _, matches in matching_engine.match_many(clients, limit=limit)
+                ]
+                body = {'results': results}
+            else:
+                matches = matching_engine.find_matching_lenders(payload, limit=limit)
+                body = {'matches': [serialize_match(match, fields) for match in matches]}
+        metrics.count('lenders_scanned', matching_engine.lenders_scanned)
+        with metrics.span('serialize'):
+            return json_response(body, request)
+    except APIError as e:
+        return json_response({'error': e.message}, request, e.status)
+    except Exception as e:
+        app.logger.error("Error in api_match: %s", e)
+        return json_response({'error': "An error occurred while matching lenders"}, request, 500)
+
+def cached_lender_page(lender):
+    """Serve a catalog lender's details page from the page cache.
+
+    Pages are keyed by the lender and the latest updated_at of its lender
+    and guideline rows, so edits picked up by the catalog render a new page.
+    The year (for the footer) and asset build are part of the key. A repeat view with a
+    matching ETag gets a 304 without a query or a render.
+    """
+    now = datetime.now()
+    last_changed = max(
+        (value for value in [lender.updated_at] + [guideline.row.get('updated_at') for guideline in lender.guidelines]
+         if value),
+        default=None
+    )
+    key = (lender.lender_id, last_changed, now.year, asset_version())
+    cache = get_lender_page_cache()
+    page = cache.get(key)
+    if page is None:
+        with request_metrics().span('render'):
+            # The template shows the lender's first guideline row, as the uncached query does
+            body = render_template('lender_details.html', lender=lender.row, guidelines=lender.guidelines[0].row, now=now)
+        page = CachedPage(body, make_etag(key, template_version('lender_details.html')), parse_timestamp(last_changed))
+        cache.put(key, page)
+    return page.response(request)
 
 @app.route('/lender-details/<int:lender_id>')
 def lender_details(lender_id):
     try:
-        db = get_db()
-        cursor = db.conn.cursor()
-
-        cursor.execute('SELECT * FROM lenders WHERE lender_id = ?', (lender_id,))
-        lender = cursor.fetchone()
-
-        cursor.execute('SELECT * FROM lender_guidelines WHERE lender_id = ?', (lender_id,))
-        guidelines = cursor.fetchone()
-
-        return render_template('lender_details.html', lender=lender, guidelines=guidelines, now=datetime.now())
+        metrics = request_metrics()
+        catalog = get_lender_catalog()
+        if catalog is not None and app.config['LENDER_PAGE_CACHE_SIZE']:
+            with metrics.span('catalog'):
+                lender = catalog.get_lender(lender_id)
+            # Lenders without guidelines aren't in the catalog; they take the query path below
+            if lender is not None:
+                return cached_lender_page(lender)
+
+        with metrics.span('db_query'):
+            db = get_db()
+            cursor = db.conn.cursor()
+
+            cursor.execute('SELECT * FROM lenders WHERE lender_id = ?', (lender_id,))
+            lender = cursor.fetchone()
+
+            cursor.execute('SELECT * FROM lender_guidelines WHERE lender_id = ?', (lender_id,))
+            guidelines = cursor.fetchone()
+
+        with metrics.span('render'):
+            return render_template('lender_details.html', lender=lender, guidelines=guidelines, now=datetime.now())
     except Exception as e:
-        app.logger.error(f"Error in lender_details: {str(e)}")
+        app.logger.error("Error in lender_details: %s", e)
         flash("An error occurred while retrieving lender details. Please try again.")
         return redirect(url_for('find_lenders'))
 
 @app.errorhandler(404)
 def page_not_found(error):
-    app.logger.warning(f"404 error: {request.path}")
-    return render_template('404.html', now=datetime.now()), 404
+    app.logger.warning("404 error: %s", request.path)
+    return static_page('404.html', status=404, cache_control='no-cache')
 
 @app.errorhandler(500)
 def server_error(e):
-    app.logger.error(f"500 error: {str(e)}")
-    return render_template('500.html', now=datetime.now()), 500
+    app.logger.error("500 error: %s", e)
+    return static_page('500.html', status=500, cache_control='no-store')
 
 # --- Landing & signup routes ----------------------------------------
 
 @app.route("/")
 def index():
-    return render_template("index.html", now=datetime.now())
+    return static_page("index.html")
 
 # Lender sign-up
 @app.route("/lender-signup", methods=["GET"])
 def lender_signup():
-    return render_template("lender_signup.html", now=datetime.now())
+    return static_page("lender_signup.html")
 
 @app.route("/lender-signup", methods=["POST"])
 def process_lender_signup():
@@ -260,7 +698,7 @@ def process_lender_signup():
 # Broker sign-up
 @app.route("/broker-signup", methods=["GET"])
 def broker_signup():
-    return render_template("broker_signup.html", now=datetime.now())
+    return static_page("broker_signup.html")
 
 @app.route("/broker-signup", methods=["POST"])
 def process_broker_signup():
@@ -0,0 +1,158 @@
+"""
+Logging setup for the BrokerBuddy application.
+
+configure_logging() installs a single stdout handler on the root logger, so
+the app, Werkzeug and library loggers each write every line once, at the
+level from LOG_LEVEL. Lines are plain text or, with LOG_FORMAT='json', one
+JSON object per line carrying the request's method and path and any
+`extra` fields, for log collectors to parse.
+
+With LOG_ASYNC, loggers only put records on an in-memory queue, and a
+QueueListener thread formats and writes them, so a slow stdout never
+blocks a request. SampledFilter thins out debug chatter on busy routes,
+keeping or dropping all of one request's debug lines together.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class RequestContextFilter(logging.Filter):
+    """Adds the current request's method and path to records logged during a request."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.method = request.method
+            record.path = request.path
+        return True
+
+class SampledFilter(logging.Filter):
+    """Passes a `rate` fraction of DEBUG records; INFO and above always pass.
+
+    The decision is made once per request, so a sampled request keeps all of
+    its debug lines and the rest keep none.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        if not has_request_context():
+            return random.random() < self.rate
+        sampled = g.get('_log_sampled')
+        if sampled is None:
+            sampled = g._log_sampled = random.random() < self.rate
+        return sampled
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one line of JSON."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class _QueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener's handler.
+
+    The stock prepare() formats the whole line on the logging thread; this
+    only merges the message arguments and renders any traceback, which
+    cannot cross the queue.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class AsyncLogging:
+    """A QueueListener writing queued records to `handler`, restarted in forked workers."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.queue_handler = _QueueHandler(queue.SimpleQueue())
+        self.listener = None
+        self.start()
+        os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.stop)
+
+    def start(self):
+        self.listener = QueueListener(self.queue_handler.queue, self.handler, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """Flush queued records and stop the listener thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _after_fork(self):
+        # The listener thread does not survive a fork; start a fresh queue and thread in the child
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.start()
+
+def configure_logging(app):
+    """Set up root logging from LOG_LEVEL, LOG_FORMAT and LOG_ASYNC in the app config.
+
+    Returns the AsyncLogging in use, or None when logging synchronously.
+    """
+    level = logging.getLevelName(str(app.config['LOG_LEVEL']).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown LOG_LEVEL: {app.config['LOG_LEVEL']}")
+
+    handler = logging.StreamHandler(sys.stdout)
+    if app.config['LOG_FORMAT'] == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    async_logging = None
+    emitter = handler
+    if app.config['LOG_ASYNC']:
+        async_logging = AsyncLogging(handler)
+        emitter = async_logging.queue_handler
+    # Request fields are read here, on the request's thread, before any queueing
+    emitter.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(emitter)
+    root.setLevel(level)
+
+    # The app logger propagates to the root handler instead of keeping Flask's own
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(logging.NOTSET)
+    return async_logging
@@ -0,0 +1,387 @@
+"""
+Static asset pipeline for the BrokerBuddy application.
+
+Run as a script during the build (before starting gunicorn) to copy
+static/css, static/js and static/img into static/dist under content-hashed
+names (css/style.3f2a9c1d04.css), so they can be cached for a year and a
+deploy changes their URLs instead of waiting for caches to expire.
+
+- Text assets (CSS, JS, SVG) get precompressed .gz and .br siblings,
+  kept only when smaller.
+- Images get a WebP copy and narrower resized variants.
+- CSS url() references are rewritten to the fingerprinted names, and a
+  background with a WebP copy gains an image-set() declaration after it.
+
+The build writes static/dist/manifest.json mapping each logical path to its
+built file. At runtime AssetManifest reads it for the asset_url() and
+asset_srcset() template helpers, and send_built_asset() serves the built
+files with far-future cache headers, picking a precompressed variant by
+Accept-Encoding. Without a manifest the helpers fall back to plain
+url_for('static') URLs, so a checkout works without a build.
+
+The .br files and image variants need Pillow and brotli, listed in
+requirements-build.txt. The build fails when either is missing, unless
+--allow-missing is given to build fingerprinted and gzipped files only.
+
+Usage (in the deploy build step):
+    pip install -r requirements.txt -r requirements-build.txt
+    python asset_pipeline.py [--static-dir static] [--clean] [--allow-missing]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from io import BytesIO
+
+try:
+    from PIL import Image
+except ImportError:  # required for builds unless --allow-missing; not needed to serve
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # required for builds unless --allow-missing; not needed to serve
+    brotli = None
+
+from flask import send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_NAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Directories under static/ that are built
+SOURCE_DIRS = ('css', 'js', 'img')
+
+TEXT_EXTENSIONS = ('.css', '.js', '.svg')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Widths generated for images wider than them; the full size is capped at MAX_IMAGE_WIDTH
+IMAGE_WIDTHS = (240, 480, 960, 1440)
+MAX_IMAGE_WIDTH = 1920
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Built files never change under a given name
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+HASH_LENGTH = 10
+
+_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+# A declaration whose value contains a url(); the value ends at ; or the closing brace
+_DECLARATION_RE = re.compile(r"(?P<prop>[\w-]+)(?P<sep>\s*:\s*)(?P<value>[^;{}]*url\([^;{}]*?)(?P<end>\s*(?:;|(?=})))")
+
+def log(message):
+    """Log a message with timestamp."""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{timestamp}] {message}")
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()[:HASH_LENGTH]
+
+def fingerprint(logical, data):
+    """Return the logical path with a content hash before the extension."""
+    stem, ext = posixpath.splitext(logical)
+    return f"{stem}.{content_hash(data)}{ext}"
+
+def variant_name(logical, width=None, ext=None):
+    """Logical name of an image variant, e.g. img/logo-480w.webp."""
+    stem, original_ext = posixpath.splitext(logical)
+    suffix = f"-{width}w" if width else ''
+    return f"{stem}{suffix}{ext or original_ext}"
+
+class AssetBuilder:
+    """Builds fingerprinted, compressed assets from static/ into static/dist."""
+
+    def __init__(self, static_dir=STATIC_DIR, progress=log):
+        self.static_dir = static_dir
+        self.dist_dir = os.path.join(static_dir, DIST_NAME)
+        self.progress = progress
+        self.files = {}
+        self.images = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def iter_sources(self, extensions):
+        for source_dir in SOURCE_DIRS:
+            root = os.path.join(self.static_dir, source_dir)
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(extensions):
+                        path = os.path.join(dirpath, filename)
+                        yield os.path.relpath(path, self.static_dir).replace(os.sep, '/'), path
+
+    def write(self, logical, data, compress=False):
+        """Write a built file under its fingerprinted name and record it in the manifest."""
+        built = fingerprint(logical, data)
+        path = os.path.join(self.dist_dir, *built.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.files[logical] = built
+        self.bytes_out += len(data)
+        if compress:
+            self.write_compressed(path, data)
+        return built
+
+    def write_compressed(self, path, data):
+        # mtime=0 keeps the .gz bytes identical between builds
+        variants = [('.gz', gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=BROTLI_QUALITY)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+
+    def build_image(self, logical, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.bytes_in += len(data)
+        if Image is not None:
+            try:
+                with Image.open(path) as image:
+                    image.load()
+                    self.build_image_variants(logical, image, data)
+                return
+            except (OSError, ValueError) as e:
+                # Some "images" in static/img are not decodable; they are still fingerprinted
+                self.progress(f"Skipping variants for {logical}: {e}")
+        self.write(logical, data)
+
+    def build_image_variants(self, logical, image, data):
+        width, height = image.size
+        ext = posixpath.splitext(logical)[1].lower()
+        # The original, recompressed when that makes it smaller (some .jpg files hold PNG data)
+        recompressed = encode_image(image, ext)
+        original = recompressed if len(recompressed) < len(data) else data
+        self.write(logical, original)
+
+        full_width = min(width, MAX_IMAGE_WIDTH)
+        widths = [w for w in IMAGE_WIDTHS if w < full_width] + [full_width]
+        webp = {}
+        for target in widths:
+            if target == width:
+                resized = image
+            else:
+                resized = image.resize((target, round(height * target / width)), Image.LANCZOS)
+                # Resized copies in the original format, for browsers without WebP
+                self.write(variant_name(logical, target), encode_image(resized, ext))
+            webp[target] = encode_image(resized, '.webp')
+
+        # Small icons can come out larger as WebP; those are only served in their own format
+        has_webp = full_width < width or len(webp[full_width]) < len(original)
+        if has_webp:
+            for target, encoded in webp.items():
+                self.write(variant_name(logical, None if target == full_width else target, '.webp'), encoded)
+        self.images[logical] = {'width': width, 'height': height, 'widths': widths, 'webp': has_webp}
+
+    def build_text(self, logical, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.bytes_in += len(data)
+        if logical.endswith('.css'):
+            data = self.rewrite_css(logical, data.decode('utf-8')).encode('utf-8')
+        self.write(logical, data, compress=True)
+
+    def rewrite_css(self, logical, css):
+        """Point url() references at built images, adding WebP image-set() fallbacks."""
+        base = posixpath.dirname(logical)
+
+        def resolve(reference, ext=None):
+            if reference.startswith(('data:', 'http:', 'https:', '//', '#')):
+                return None
+            target = posixpath.normpath(posixpath.join(base, reference.split('?')[0].split('#')[0]))
+            if ext is not None:
+                target = variant_name(target, ext=ext)
+            built = self.files.get(target)
+            return posixpath.relpath(built, base) if built else None
+
+        def replace_urls(value, ext=None):
+            def repl(match):
+                built = resolve(match.group(2), ext)
+                return f"url('{built}')" if built else match.group(0)
+            return _URL_RE.sub(repl, value)
+
+        def image_set(match):
+            mime = mimetypes.guess_type(match.group(2))[0]
+            webp, original = resolve(match.group(2), '.webp'), resolve(match.group(2))
+            if not (webp and original and mime):
+                return match.group(0)
+            return f"image-set(url('{webp}') type('image/webp'), url('{original}') type('{mime}'))"
+
+        def declaration(match):
+            prop, sep, value = match.group('prop'), match.group('sep'), match.group('value')
+            rewritten = f"{prop}{sep}{replace_urls(value)}"
+            with_webp = _URL_RE.sub(image_set, value)
+            if with_webp == value:
+                return rewritten + match.group('end')
+            # Browsers without image-set() type() support keep the first declaration
+            return f"{rewritten};\n  {prop}: {with_webp};"
+
+        return _DECLARATION_RE.sub(declaration, css)
+
+    def write_manifest(self):
+        manifest = {'files': self.files, 'images': self.images}
+        data = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+        path = os.path.join(self.dist_dir, MANIFEST_NAME)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def run(self, clean=False):
+        """Build every asset. Old builds are kept unless `clean`, so pages cached
+        by clients and other workers keep resolving until they are refreshed."""
+        if clean and os.path.isdir(self.dist_dir):
+            shutil.rmtree(self.dist_dir)
+        os.makedirs(self.dist_dir, exist_ok=True)
+        # Images first, so stylesheets can reference their built names
+        for logical, path in self.iter_sources(IMAGE_EXTENSIONS):
+            self.build_image(logical, path)
+        for logical, path in self.iter_sources(TEXT_EXTENSIONS):
+            self.build_text(logical, path)
+        self.write_manifest()
+        self.progress(f"Built {len(self.files)} assets into {self.dist_dir} "
+                      f"({self.bytes_in / 1024:.0f} KB of sources, {self.bytes_out / 1024:.0f} KB built)")
+        return self.files
+
+def encode_image(image, ext):
+    """Encode a Pillow image in the format for `ext`."""
+    buffer = BytesIO()
+    if ext == '.webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    elif ext in ('.jpg', '.jpeg'):
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+class AssetManifest:
+    """The build manifest, read lazily per worker and reloaded when it changes on disk."""
+
+    def __init__(self, static_dir=STATIC_DIR, check_interval=30):
+        self.path = os.path.join(static_dir, DIST_NAME, MANIFEST_NAME)
+        self.check_interval = check_interval
+        self.files = {}
+        self.images = {}
+        self.version = None
+        self._mtime = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Reload the manifest if it changed; returns its version (None without a build)."""
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.check_interval:
+            return self.version
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                self.files, self.images, self.version, self._mtime = {}, {}, None, None
+                return None
+            if mtime == self._mtime:
+                return self.version
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            manifest = json.loads(data)
+            self.files = manifest.get('files', {})
+            self.images = manifest.get('images', {})
+            self.version = content_hash(data)
+            self._mtime = mtime
+            return self.version
+
+    def url(self, filename):
+        """URL of a static file: its fingerprinted build if there is one, else the plain static URL."""
+        self.refresh()
+        built = self.files.get(filename)
+        if built is None:
+            return url_for('static', filename=filename)
+        return url_for('built_asset', filename=built)
+
+    def srcset(self, filename, ext=None):
+        """A srcset listing an image's built widths, as WebP when `ext` is '.webp'.
+
+        Returns '' when the image has no variants, so a template can skip the
+        source element.
+        """
+        self.refresh()
+        image = self.images.get(filename)
+        if image is None or (ext == '.webp' and not image['webp']):
+            return ''
+        full_width = image['widths'][-1]
+        candidates = []
+        for width in image['widths']:
+            if ext is not None:
+                logical = variant_name(filename, None if width == full_width else width, ext)
+            else:
+                logical = filename if width == image['width'] else variant_name(filename, width)
+            built = self.files.get(logical)
+            if built is not None:
+                candidates.append(f"{url_for('built_asset', filename=built)} {width}w")
+        return ', '.join(candidates)
+
+def send_built_asset(dist_dir, filename, request):
+    """Serve a built asset, precompressed when the client accepts it, cached for a year."""
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encodings = request.accept_encodings
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in encodings:
+            try:
+                response = send_from_directory(dist_dir, filename + suffix, mimetype=mimetype,
+                                               max_age=ASSET_MAX_AGE)
+            except NotFound:
+                continue
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(dist_dir, filename, max_age=ASSET_MAX_AGE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def missing_build_dependencies():
+    """Names of the requirements-build.txt packages that are not installed."""
+    missing = []
+    if Image is None:
+        missing.append('Pillow (WebP and resized images)')
+    if brotli is None:
+        missing.append('brotli (.br files)')
+    return missing
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--static-dir', default=STATIC_DIR, help="Static directory to build from")
+    parser.add_argument('--clean', action='store_true', help="Remove earlier builds first")
+    parser.add_argument('--allow-missing', action='store_true',
+                        help="Build without the image variants or .br files whose packages are missing")
+    args = parser.parse_args()
+
+    missing = missing_build_dependencies()
+    if missing:
+        if not args.allow_missing:
+            log(f"Missing build dependencies: {', '.join(missing)}; "
+                f"install requirements-build.txt or pass --allow-missing")
+            sys.exit(1)
+        log(f"Building without: {', '.join(missing)}")
+    AssetBuilder(args.static_dir).run(clean=args.clean)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark for loading lender guidelines in the matching engine.
+
+Compares the old per-lender guideline lookup (one query per lender) with the
+bulk loading path used by MatchingEngine.find_matching_lenders, across a range
+of lender catalog sizes.
+
+Usage:
+    python benchmarks/bench_guideline_fetch.py [--sizes 100,1000,5000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_reset_db
+from lender_catalog import load_compiled_lenders
+from matching_engine import MatchingEngine
+
+SAMPLE_CLIENT = {
+    'business_name': 'Benchmark Construction LLC',
+    'industry': 'Construction',
+    'time_in_business': '2 years',
+    'monthly_revenue': '50000',
+    'credit_score': '650-699',
+    'equipment_type': 'Construction',
+    'equipment_cost': '$150,000',
+}
+
+def build_catalog(db_path, lender_count):
+    """Create a database with the app schema and a synthetic lender catalog."""
+    conn = sqlite3.connect(db_path)
+    simple_reset_db.create_schema(conn)
+    now = datetime.now().isoformat()
+    cursor = conn.cursor()
+    cursor.executemany('''
+    INSERT INTO lenders (name, program_type, description, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ''', [(f"Lender {i}", "App Only", "Synthetic lender", now, now) for i in range(lender_count)])
+    cursor.executemany('''
+    INSERT INTO lender_guidelines (
+        lender_id, min_credit_score, min_time_in_business, min_equipment_cost,
+        max_equipment_cost, equipment_types, industries_accepted, created_at, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (i + 1, str(550 + (i % 200)), str(6 + (i % 36)), "5000", str(100000 + 1000 * (i % 500)),
+         "Construction, Transportation, Manufacturing", "All", now, now)
+        for i in range(lender_count)
+    ])
+    conn.commit()
+    return conn
+
+def per_lender_fetch(conn):
+    """The original access pattern: one guideline query per lender."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM lenders')
+    pairs = []
+    for lender in cursor.fetchall():
+        cursor.execute('SELECT * FROM lender_guidelines WHERE lender_id = ?', (lender['lender_id'],))
+        guidelines = cursor.fetchone()
+        if guidelines:
+            pairs.append((lender, [guidelines]))
+    return pairs
+
+def time_call(func, repeat):
+    """Return the best wall-clock time in milliseconds over `repeat` runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,500,1000,2500,5000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    simple_reset_db.log = lambda message: None
+
+    print(f"{'lenders':>8} {'per-lender ms':>14} {'bulk ms':>10} {'speedup':>8} {'match ms':>10}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = build_catalog(os.path.join(tmp, 'bench.db'), size)
+            engine = MatchingEngine(conn)
+
+            old_ms = time_call(lambda: per_lender_fetch(conn), args.repeat)
+            new_ms = time_call(lambda: load_compiled_lenders(conn), args.repeat)
+            match_ms = time_call(lambda: engine.find_matching_lenders(SAMPLE_CLIENT), args.repeat)
+            conn.close()
+
+        print(f"{size:>8} {old_ms:>14.2f} {new_ms:>10.2f} {old_ms / new_ms:>7.1f}x {match_ms:>10.2f}")
+
+if __name__ == '__main__':
+    main()
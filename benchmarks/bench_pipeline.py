@@ -0,0 +1,308 @@
+"""
+Benchmark suite for the matching engine and request pipeline.
+
+Builds synthetic lender catalogs (simple_reset_db.py schema) at each size and
+times a stream of synthetic clients through:
+
+    find_matching_lenders  MatchingEngine configured as the app configures it
+    save_match_results     writing each client's matches to the matches table
+    submit_client          POST /submit-client end to end via the Flask test client
+    lender_details         GET /lender-details/<id> via the Flask test client
+
+Each scenario reports p50/p95/p99 latency and throughput. --json writes the
+results to a file, and --compare prints the change against an earlier one.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--sizes 100,1000,10000] [--clients 200]
+        [--scenarios find_matching_lenders,submit_client] [--json results.json]
+        [--compare baseline.json]
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_reset_db
+from lender_catalog import LenderCatalog
+from matching_engine import MatchingEngine, write_match_results
+
+SCENARIOS = ('find_matching_lenders', 'save_match_results', 'submit_client', 'lender_details')
+
+PROGRAM_TYPES = ['App Only', 'Full Financials', 'Working Capital']
+EQUIPMENT_TYPES = ['Construction', 'Transportation', 'Manufacturing', 'Medical', 'Restaurant', 'Trucks',
+                   'Excavator', 'Agriculture', 'Technology', 'Printing']
+INDUSTRIES = ['construction', 'retail', 'healthcare', 'trucking', 'manufacturing', 'hospitality', 'technology']
+
+CLIENT_CREDIT_SCORES = ['550-599', '600-649', '650-699', '700+', '720', '800']
+CLIENT_TIMES_IN_BUSINESS = ['6 months', '1 year', '2 years', '5+ years', '18', '10+ years']
+
+def build_catalog(db_path, lender_count, seed=0):
+    """Create a database with the app schema and a varied synthetic lender catalog.
+
+    About one lender in five has a second guideline row, and optional
+    requirements are left blank at random, as in real partner rate sheets.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    simple_reset_db.create_schema(conn)
+    now = datetime.now().isoformat()
+
+    lenders = []
+    guidelines = []
+    for lender_id in range(1, lender_count + 1):
+        program_type = rng.choice(PROGRAM_TYPES)
+        lenders.append((lender_id, f"Lender {lender_id}", program_type, f"Synthetic {program_type} lender",
+                        f"https://example.com/lender-{lender_id}", f"lender{lender_id}@example.com",
+                        "800-555-0100", now, now))
+        for _ in range(2 if rng.random() < 0.2 else 1):
+            min_cost = rng.choice([0, 5000, 10000, 25000])
+            guidelines.append((
+                lender_id,
+                str(rng.randrange(550, 751, 10)),
+                rng.choice(['6 months', '1 year', '2 years', '3 years', '24']),
+                rng.choice(['', '10000', '25000', '50000']),
+                str(min_cost) if min_cost else '',
+                str(rng.choice([100000, 150000, 250000, 500000, 1000000])),
+                ', '.join(rng.sample(EQUIPMENT_TYPES, rng.randint(1, 4))) if rng.random() < 0.8 else 'All equipment types',
+                ', '.join(rng.sample(INDUSTRIES, rng.randint(1, 3))) if rng.random() < 0.7 else 'all',
+                'Adult Entertainment, Gambling',
+                rng.choice(['1-2 days', '3-5 days']),
+                '8%-15%', '2-5 years', 'Up to 100%',
+                now, now
+            ))
+
+    conn.executemany('''
+    INSERT INTO lenders (lender_id, name, program_type, description, website, contact_email, contact_phone,
+                         created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', lenders)
+    conn.executemany('''
+    INSERT INTO lender_guidelines (
+        lender_id, min_credit_score, min_time_in_business, min_monthly_revenue,
+        min_equipment_cost, max_equipment_cost, equipment_types, industries_accepted,
+        industries_restricted, funding_speed, rate_range, term_range, advance_rate,
+        created_at, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', guidelines)
+    conn.commit()
+    return conn
+
+def generate_clients(count, seed=1):
+    """Return `count` synthetic client form submissions."""
+    rng = random.Random(seed)
+    return [{
+        'business_name': f"Benchmark Client {i}",
+        'industry': rng.choice(INDUSTRIES).title(),
+        'time_in_business': rng.choice(CLIENT_TIMES_IN_BUSINESS),
+        'monthly_revenue': rng.choice(['', '20000', '$50,000', '120000']),
+        'credit_score': rng.choice(CLIENT_CREDIT_SCORES),
+        'equipment_type': rng.choice(EQUIPMENT_TYPES),
+        'equipment_cost': f"${rng.randrange(5000, 800000, 2500):,}",
+        'notes': '',
+        'needs_working_capital': rng.choice(['', 'yes']),
+    } for i in range(count)]
+
+def insert_clients(conn, clients):
+    """Insert clients as submit_client does; return their client_ids."""
+    now = datetime.now().isoformat()
+    cursor = conn.cursor()
+    client_ids = []
+    for client in clients:
+        cursor.execute('''
+        INSERT INTO clients (
+            business_name, credit_score, time_in_business, monthly_revenue,
+            equipment_type, equipment_cost, industry, notes, interested_in_wc, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (client['business_name'], client['credit_score'], client['time_in_business'],
+              client['monthly_revenue'], client['equipment_type'], client['equipment_cost'],
+              client['industry'], client['notes'], client['needs_working_capital'], now, now))
+        client_ids.append(cursor.lastrowid)
+    conn.commit()
+    return client_ids
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(scenario, lenders, samples, elapsed):
+    """Latency percentiles (ms) and throughput for per-operation durations in seconds."""
+    timings = sorted(sample * 1000 for sample in samples)
+    return {
+        'scenario': scenario,
+        'lenders': lenders,
+        'samples': len(timings),
+        'mean_ms': round(sum(timings) / len(timings), 4),
+        'p50_ms': round(percentile(timings, 50), 4),
+        'p95_ms': round(percentile(timings, 95), 4),
+        'p99_ms': round(percentile(timings, 99), 4),
+        'max_ms': round(timings[-1], 4),
+        'throughput_per_s': round(len(timings) / elapsed, 2) if elapsed else None,
+    }
+
+def time_each(func, items, warmup=5):
+    """Call func(item) for every item; return (per-call durations, total seconds).
+
+    The first `warmup` items are run untimed first, so caches and the lender
+    catalog are loaded before measuring.
+    """
+    for item in items[:warmup]:
+        func(item)
+    samples = []
+    started = time.perf_counter()
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        samples.append(time.perf_counter() - start)
+    return samples, time.perf_counter() - started
+
+def make_engine(conn, catalog, args):
+    return MatchingEngine(conn, catalog=catalog, vectorized=not args.scalar, limit=args.limit or None)
+
+def bench_find_matching_lenders(db_path, lenders, clients, args):
+    conn = sqlite3.connect(db_path)
+    catalog = LenderCatalog(db_path)
+    try:
+        engine = make_engine(conn, catalog, args)
+        samples, elapsed = time_each(engine.find_matching_lenders, clients)
+    finally:
+        catalog.close()
+        conn.close()
+    return summarize('find_matching_lenders', lenders, samples, elapsed)
+
+def bench_save_match_results(db_path, lenders, clients, args):
+    conn = sqlite3.connect(db_path)
+    catalog = LenderCatalog(db_path)
+    try:
+        engine = make_engine(conn, catalog, args)
+        client_ids = insert_clients(conn, clients)
+        results = [(client_id, engine.find_matching_lenders(client))
+                   for client_id, client in zip(client_ids, clients)]
+        samples, elapsed = time_each(lambda result: write_match_results(conn, *result), results)
+    finally:
+        catalog.close()
+        conn.close()
+    return summarize('save_match_results', lenders, samples, elapsed)
+
+def flask_client(db_path, args):
+    # Imported here so the engine-only scenarios don't need Flask
+    import app as app_module
+
+    flask_app = app_module.app
+    flask_app.config.update(
+        DATABASE_PATH=db_path,
+        TESTING=True,
+        MATCHING_VECTORIZED=not args.scalar,
+        MATCH_RESULT_LIMIT=args.limit,
+    )
+    return flask_app.test_client()
+
+def bench_submit_client(db_path, lenders, clients, args):
+    client = flask_client(db_path, args)
+
+    def submit(form):
+        response = client.post('/submit-client', data=form)
+        if response.status_code != 302 or '/find-lenders' not in response.headers.get('Location', ''):
+            raise RuntimeError(f"submit_client failed with status {response.status_code}")
+
+    samples, elapsed = time_each(submit, clients)
+    return summarize('submit_client', lenders, samples, elapsed)
+
+def bench_lender_details(db_path, lenders, clients, args):
+    client = flask_client(db_path, args)
+    rng = random.Random(2)
+    lender_ids = [rng.randint(1, lenders) for _ in clients]
+
+    def details(lender_id):
+        response = client.get(f'/lender-details/{lender_id}')
+        if response.status_code != 200:
+            raise RuntimeError(f"lender_details failed with status {response.status_code}")
+
+    samples, elapsed = time_each(details, lender_ids)
+    return summarize('lender_details', lenders, samples, elapsed)
+
+BENCHMARKS = {
+    'find_matching_lenders': bench_find_matching_lenders,
+    'save_match_results': bench_save_match_results,
+    'submit_client': bench_submit_client,
+    'lender_details': bench_lender_details,
+}
+
+def print_results(results, baseline=None):
+    baseline = {(row['scenario'], row['lenders']): row for row in (baseline or {}).get('results', [])}
+    header = (f"{'scenario':>22} {'lenders':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    if baseline:
+        header += f" {'p50 vs base':>12} {'p95 vs base':>12}"
+    print(header)
+    for row in results:
+        line = (f"{row['scenario']:>22} {row['lenders']:>8} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} "
+                f"{row['p99_ms']:>9.3f} {row['throughput_per_s']:>9.1f}")
+        base = baseline.get((row['scenario'], row['lenders']))
+        if base:
+            line += (f" {row['p50_ms'] / base['p50_ms'] - 1:>+11.1%}"
+                     f" {row['p95_ms'] / base['p95_ms'] - 1:>+11.1%}")
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help="Comma-separated lender catalog sizes (up to 100000)")
+    parser.add_argument('--clients', type=int, default=200, help="Clients timed per scenario and size")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--limit', type=int, default=0, help="Match result limit, as MATCH_RESULT_LIMIT (0 for all, the default)")
+    parser.add_argument('--scalar', action='store_true', help="Use the per-lender scoring loop instead of NumPy")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_path', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(',') if scenario.strip()]
+    unknown = [scenario for scenario in scenarios if scenario not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    simple_reset_db.log = lambda message: None
+    # The app logs every request at DEBUG; keep that out of the report
+    logging.disable(logging.CRITICAL)
+
+    clients = generate_clients(args.clients, seed=args.seed + 1)
+    results = []
+    for size in [int(s) for s in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            for scenario in scenarios:
+                # A fresh catalog per scenario, so saved clients and matches don't carry over
+                db_path = os.path.join(tmp, f'{scenario}.db')
+                build_catalog(db_path, size, seed=args.seed).close()
+                results.append(BENCHMARKS[scenario](db_path, size, clients, args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.json_path:
+        report = {
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'options': {'clients': args.clients, 'limit': args.limit, 'scalar': args.scalar, 'seed': args.seed},
+            'results': results,
+        }
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.json_path}")
+
+if __name__ == '__main__':
+    main()
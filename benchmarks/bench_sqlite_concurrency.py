@@ -0,0 +1,124 @@
+"""
+Concurrency benchmark for SQLite pragma profiles.
+
+Runs several writer processes (inserting a client and its match rows, as
+submit_client does) and reader processes (running the lender_details queries)
+against one database file, and reports write and read throughput for each
+profile in database_schema.PRAGMA_PROFILES.
+
+Usage:
+    python benchmarks/bench_sqlite_concurrency.py [--writers 4] [--readers 4] [--seconds 5]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_reset_db
+from database_schema import BrokerBuddyDB, resolve_pragmas
+
+MATCHES_PER_CLIENT = 20
+
+def writer(db_path, pragmas, lender_count, deadline, results):
+    db = BrokerBuddyDB(db_path, pragmas=pragmas)
+    conn = db.connect()
+    writes = errors = 0
+    while time.time() < deadline:
+        now = datetime.now().isoformat()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+            INSERT INTO clients (
+                business_name, credit_score, time_in_business, monthly_revenue,
+                equipment_type, equipment_cost, industry, notes, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', ('Bench LLC', '650-699', '2 years', '50000', 'Construction', '150000', 'Construction', '', now, now))
+            client_id = cursor.lastrowid
+            conn.commit()
+            cursor.executemany('''
+            INSERT INTO matches (client_id, lender_id, match_score, match_details, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ''', [(client_id, (client_id + i) % lender_count + 1, 80.0, '[]', now) for i in range(MATCHES_PER_CLIENT)])
+            conn.commit()
+            writes += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors += 1
+    db.close()
+    results.put(('write', writes, errors))
+
+def reader(db_path, pragmas, lender_count, deadline, results):
+    db = BrokerBuddyDB(db_path, pragmas=pragmas)
+    conn = db.connect()
+    reads = errors = 0
+    lender_id = 0
+    while time.time() < deadline:
+        lender_id = lender_id % lender_count + 1
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM lenders WHERE lender_id = ?', (lender_id,))
+            cursor.fetchone()
+            cursor.execute('SELECT * FROM lender_guidelines WHERE lender_id = ?', (lender_id,))
+            cursor.fetchone()
+            reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    db.close()
+    results.put(('read', reads, errors))
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(db_path)
+        simple_reset_db.create_schema(conn)
+        simple_reset_db.populate_sample_data(conn)
+        lender_count = conn.execute('SELECT COUNT(*) FROM lenders').fetchone()[0]
+        conn.close()
+
+        pragmas = resolve_pragmas(profile)
+        results = multiprocessing.Queue()
+        deadline = time.time() + args.seconds
+        processes = [
+            multiprocessing.Process(target=writer, args=(db_path, pragmas, lender_count, deadline, results))
+            for _ in range(args.writers)
+        ] + [
+            multiprocessing.Process(target=reader, args=(db_path, pragmas, lender_count, deadline, results))
+            for _ in range(args.readers)
+        ]
+        for process in processes:
+            process.start()
+        totals = {'write': [0, 0], 'read': [0, 0]}
+        for _ in processes:
+            kind, count, errors = results.get()
+            totals[kind][0] += count
+            totals[kind][1] += errors
+        for process in processes:
+            process.join()
+        return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--profiles', default='default,performance')
+    args = parser.parse_args()
+
+    simple_reset_db.log = lambda message: None
+
+    print(f"{args.writers} writer and {args.readers} reader processes, {args.seconds:g}s per profile")
+    print(f"{'profile':>12} {'writes/s':>10} {'write errors':>13} {'reads/s':>10} {'read errors':>12}")
+    for profile in args.profiles.split(','):
+        totals = run_profile(profile, args)
+        print(f"{profile:>12} {totals['write'][0] / args.seconds:>10.0f} {totals['write'][1]:>13} "
+              f"{totals['read'][0] / args.seconds:>10.0f} {totals['read'][1]:>12}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Client input normalization for the BrokerBuddy matching engine.
+
+Form values such as "650-699", "2 years" and "$150,000" are parsed once per
+request into an immutable ClientProfile, which the matching engine scores
+against every lender. Brokers submit the same dropdown values over and over,
+so the parsers are memoized with a bounded LRU cache.
+"""
+
+import re
+from functools import lru_cache
+
+PARSE_CACHE_SIZE = 4096
+
+# Everything except ASCII digits and '.'; used for ASCII input, where it
+# keeps exactly the characters the str.isdigit() filter below keeps
+_NON_NUMERIC = re.compile(r'[^0-9.]')
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _convert_string_to_number(value):
+    if value.isascii():
+        clean_value = _NON_NUMERIC.sub('', value)
+    else:
+        clean_value = ''.join(c for c in value if c.isdigit() or c == '.')
+    if not clean_value:
+        return 0
+    try:
+        return float(clean_value)
+    except (ValueError, TypeError):
+        return 0
+
+def safe_convert_to_number(value):
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        return _convert_string_to_number(value)
+    return 0
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_credit_score_string(credit_str):
+    try:
+        if '-' in credit_str:
+            parts = credit_str.split('-')
+            return int(parts[0].strip())
+        if '+' in credit_str:
+            return int(credit_str.replace('+', '').strip())
+        return int(credit_str.strip())
+    except (ValueError, AttributeError):
+        return 0
+
+def parse_credit_score(credit_score):
+    """Parse a credit score or range ("650-699", "700+") to its lower bound."""
+    return _parse_credit_score_string(str(credit_score).lower())
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_time_in_business_string(time_str):
+    try:
+        if 'year' in time_str:
+            years = time_str.replace('years', '').replace('year', '').strip()
+            if '+' in years:
+                years = years.replace('+', '')
+            return int(float(years)) * 12
+        if 'month' in time_str:
+            months = time_str.replace('months', '').replace('month', '').strip()
+            if '+' in months:
+                months = months.replace('+', '')
+            return int(months)
+        return int(float(time_str))
+    except (ValueError, AttributeError):
+        return 0
+
+def parse_time_in_business(time_in_business):
+    """Parse a time in business ("2 years", "6 months", "18") to months."""
+    return _parse_time_in_business_string(str(time_in_business).lower())
+
+_YES_VALUES = frozenset(('yes', 'y', 'true', '1', 'on'))
+
+def parse_yes(value):
+    """Parse a yes/no form value to True, or None for anything but yes."""
+    return True if str(value).strip().lower() in _YES_VALUES else None
+
+class ClientProfile:
+    """Parsed, immutable view of the client fields used for matching.
+
+    Each attribute is None when the client did not provide that field;
+    interested_in_wc is True or None. Scoring rules name these attributes as
+    their client_field.
+    """
+
+    __slots__ = ('credit_score', 'time_in_business', 'equipment_cost', 'equipment_type', 'industry',
+                 'monthly_revenue', 'interested_in_wc')
+
+    def __init__(self, credit_score=None, time_in_business=None, equipment_cost=None,
+                 equipment_type=None, industry=None, monthly_revenue=None, interested_in_wc=None):
+        set_attr = object.__setattr__
+        set_attr(self, 'credit_score', credit_score)
+        set_attr(self, 'time_in_business', time_in_business)
+        set_attr(self, 'equipment_cost', equipment_cost)
+        set_attr(self, 'equipment_type', equipment_type)
+        set_attr(self, 'industry', industry)
+        set_attr(self, 'monthly_revenue', monthly_revenue)
+        set_attr(self, 'interested_in_wc', interested_in_wc)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ClientProfile is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ClientProfile is immutable")
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"ClientProfile({fields})"
+
+    @classmethod
+    def from_client_data(cls, client_data):
+        """Build a profile from a client_data dict (form values or a clients row)."""
+        def provided(field):
+            return client_data[field] if field in client_data and client_data[field] else None
+
+        credit_score = provided('credit_score')
+        time_in_business = provided('time_in_business')
+        equipment_cost = provided('equipment_cost')
+        equipment_type = provided('equipment_type')
+        industry = provided('industry')
+        monthly_revenue = provided('monthly_revenue')
+        # The client form names the working capital question needs_working_capital
+        interested_in_wc = provided('interested_in_wc') or provided('needs_working_capital')
+        return cls(
+            parse_credit_score(credit_score) if credit_score is not None else None,
+            parse_time_in_business(time_in_business) if time_in_business is not None else None,
+            safe_convert_to_number(equipment_cost) if equipment_cost is not None else None,
+            str(equipment_type).lower() if equipment_type is not None else None,
+            str(industry).lower() if industry is not None else None,
+            safe_convert_to_number(monthly_revenue) if monthly_revenue is not None else None,
+            parse_yes(interested_in_wc) if interested_in_wc is not None else None
+        )
@@ -8,23 +8,160 @@ It includes four main tables: clients, lenders, lender_guidelines, and matches.
 import sqlite3
 import os
 import datetime
+import queue
+import threading
+
+from lender_import import LenderImporter, iter_old_db_records
+
+# Named sets of PRAGMA settings applied to every new connection. "performance"
+# uses WAL so readers are not blocked by concurrent writers.
+PRAGMA_PROFILES = {
+    'default': {},
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -20000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    },
+}
+
+def resolve_pragmas(profile='default', overrides=None):
+    """Return the PRAGMA settings for a profile name, with overrides applied."""
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown SQLite pragma profile: {profile}")
+    pragmas = dict(PRAGMA_PROFILES[profile])
+    pragmas.update(overrides or {})
+    return pragmas
+
+def apply_pragmas(conn, pragmas):
+    """Apply PRAGMA settings to a connection."""
+    for name, value in (pragmas or {}).items():
+        if not name.isidentifier() or not str(value).replace('-', '').isalnum():
+            raise ValueError(f"Invalid SQLite pragma: {name}={value}")
+        conn.execute(f"PRAGMA {name} = {value}")
+
+# Client columns added after the original schema, with their types
+CLIENT_COLUMN_MIGRATIONS = {
+    'interested_in_wc': 'TEXT',
+}
+
+def ensure_client_columns(conn):
+    """Add client columns missing from databases created before they existed."""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(clients)').fetchall()}
+    if not columns:
+        return
+    for name, column_type in CLIENT_COLUMN_MIGRATIONS.items():
+        if name not in columns:
+            try:
+                conn.execute(f'ALTER TABLE clients ADD COLUMN {name} {column_type}')
+            except sqlite3.OperationalError as e:
+                # Another worker added it first
+                if 'duplicate column' not in str(e):
+                    raise
+    conn.commit()
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections to one database file.
+
+    Connections are opened lazily up to `size` and set up once when opened.
+    They are created with check_same_thread=False so that threaded workers
+    can hand them between request threads; a connection is only ever used
+    by the thread that acquired it.
+    """
+
+    def __init__(self, db_path, size=5, timeout=30.0, pragmas=None):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn, self.pragmas)
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, opening one if the pool is not full."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                open_new = True
+            else:
+                open_new = False
+
+        if open_new:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No database connection available after {self.timeout} seconds")
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = sqlite3.Row
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
 
 class BrokerBuddyDB:
-    def __init__(self, db_path):
-        """Initialize the database connection."""
+    def __init__(self, db_path, pool=None, pragmas=None):
+        """Initialize the database connection, optionally backed by a ConnectionPool.
+
+        `pragmas` (see resolve_pragmas) are applied to connections opened here;
+        pooled connections use the pool's own settings.
+        """
         self.db_path = db_path
+        self.pool = pool
+        self.pragmas = pragmas
         self.conn = None
     
     def connect(self):
         """Connect to the SQLite database."""
+        if self.pool:
+            self.conn = self.pool.acquire()
+            return self.conn
         self.conn = sqlite3.connect(self.db_path)
         self.conn.row_factory = sqlite3.Row
+        apply_pragmas(self.conn, self.pragmas)
         return self.conn
     
     def close(self):
-        """Close the database connection."""
+        """Close the database connection, or return it to the pool."""
         if self.conn:
-            self.conn.close()
+            if self.pool:
+                self.pool.release(self.conn)
+                self.conn = None
+            else:
+                self.conn.close()
     
     def initialize_database(self):
         """Create the database tables if they don't exist."""
@@ -121,113 +258,18 @@ class BrokerBuddyDB:
         self.close()
         
     def import_existing_lenders(self, old_db_path):
-        """Import lenders from the existing database."""
+        """Import lenders from the existing database.
+
+        Streams the old lenders and their criteria through lender_import's
+        bulk importer; see lender_import.py for CSV and JSONL sources.
+        """
         if not os.path.exists(old_db_path):
             return False
-            
-        old_conn = sqlite3.connect(old_db_path)
-        old_conn.row_factory = sqlite3.Row
-        old_cursor = old_conn.cursor()
-        
-        new_conn = self.connect()
-        new_cursor = new_conn.cursor()
-        
-        # Get lenders from old database
-        old_cursor.execute('SELECT * FROM lenders')
-        old_lenders = old_cursor.fetchall()
-        
-        # Get criteria categories from old database
-        old_cursor.execute('SELECT * FROM criteria_categories')
-        old_categories = old_cursor.fetchall()
-        
-        # Get lender criteria from old database
-        old_cursor.execute('SELECT * FROM lender_criteria')
-        old_criteria = old_cursor.fetchall()
-        
-        # Map old lenders to new schema
-        for old_lender in old_lenders:
-            # Insert into new lenders table
-            new_cursor.execute('''
-            INSERT INTO lenders (
-                name, description, min_amount, max_amount, 
-                industries_served, active
-            ) VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                old_lender['name'],
-                old_lender['program_type'],  # Use program_type as description
-                0,  # Default min_amount
-                0,  # Default max_amount
-                '',  # Default industries_served
-                1   # Active by default
-            ))
-            
-            new_lender_id = new_cursor.lastrowid
-            
-            # Get criteria for this lender
-            lender_criteria = [c for c in old_criteria if c['lender_id'] == old_lender['id']]
-            
-            # Map criteria to new schema
-            min_credit_score = None
-            min_time_in_business = None
-            equipment_types = None
-            
-            for criterion in lender_criteria:
-                category_id = criterion['category_id']
-                category = next((c for c in old_categories if c['id'] == category_id), None)
-                
-                if category:
-                    category_name = category['name']
-                    value = criterion['value']
-                    
-                    if category_name == 'personal_credit':
-                        # Extract numeric value from credit score range
-                        if '+' in value:
-                            min_credit_score = int(value.replace('+', ''))
-                        elif '-' in value:
-                            min_credit_score = int(value.split('-')[0])
-                    
-                    elif category_name == 'time_in_business':
-                        # Extract numeric value from time in business
-                        if 'years' in value.lower() or 'year' in value.lower():
-                            years = value.lower().replace('years', '').replace('year', '').strip()
-                            if '+' in years:
-                                min_time_in_business = int(years.replace('+', '')) * 12
-                            else:
-                                min_time_in_business = int(float(years)) * 12
-                        elif 'months' in value.lower() or 'month' in value.lower():
-                            months = value.lower().replace('months', '').replace('month', '').strip()
-                            min_time_in_business = int(months)
-                    
-                    elif category_name == 'amount_considered':
-                        # Extract numeric values from amount range
-                        if '-' in value:
-                            parts = value.replace('$', '').replace('k', '000').replace('K', '000').split('-')
-                            min_amount = float(parts[0].strip())
-                            max_amount = float(parts[1].strip())
-                            
-                            # Update lender with amount range
-                            new_cursor.execute('''
-                            UPDATE lenders SET min_amount = ?, max_amount = ? WHERE id = ?
-                            ''', (min_amount, max_amount, new_lender_id))
-                    
-                    elif category_name == 'equipment_type' or category_name == 'collateral_type':
-                        equipment_types = value
-            
-            # Insert into lender_guidelines
-            new_cursor.execute('''
-            INSERT INTO lender_guidelines (
-                lender_id, min_credit_score, min_time_in_business, 
-                equipment_types
-            ) VALUES (?, ?, ?, ?)
-            ''', (
-                new_lender_id,
-                min_credit_score or 0,
-                min_time_in_business or 0,
-                equipment_types or ''
-            ))
-        
-        new_conn.commit()
-        old_conn.close()
-        self.close()
-        
+
+        conn = self.connect()
+        try:
+            LenderImporter(conn).run(iter_old_db_records(old_db_path))
+        finally:
+            self.close()
+
         return True
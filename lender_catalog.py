@@ -0,0 +1,154 @@
+"""
+In-process lender catalog for the BrokerBuddy matching engine.
+
+Lenders and their guideline rows are loaded once per worker, together with the
+structures compiled from them (scoring plans, score columns and indexes), so
+that matching a client is a pure in-memory operation. The catalog refreshes
+itself when the lender tables change.
+"""
+
+import sqlite3
+import threading
+
+from database_schema import apply_pragmas
+
+def _row_value(row, key):
+    return row[key] if key in row.keys() else None
+
+class CompiledGuideline:
+    """A lender_guidelines row as loaded into the catalog.
+
+    Requirements are parsed from ``row`` by the scoring rules when a
+    ScoringPlan is compiled. Guidelines are hashable by identity, so plans
+    and indexes can key on them.
+    """
+
+    __slots__ = ('guideline_id', 'lender_id', 'row')
+
+    def __init__(self, row):
+        self.row = dict(row)
+        self.guideline_id = _row_value(row, 'guideline_id')
+        self.lender_id = row['lender_id']
+
+class CompiledLender:
+    """A lender with the compiled guideline rows that belong to it."""
+
+    __slots__ = ('lender_id', 'name', 'program_type', 'description', 'updated_at', 'guidelines', 'row')
+
+    def __init__(self, row, guidelines):
+        self.row = dict(row)
+        self.lender_id = row['lender_id']
+        self.name = row['name']
+        self.program_type = _row_value(row, 'program_type')
+        self.description = row['description']
+        self.updated_at = _row_value(row, 'updated_at')
+        self.guidelines = tuple(guidelines)
+
+def load_compiled_lenders(conn):
+    """Fetch every lender with its guideline rows in two bulk queries.
+
+    Returns a tuple of CompiledLender in lender order. Lenders without any
+    guideline row are left out.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute('SELECT * FROM lender_guidelines ORDER BY rowid')
+    guidelines_by_lender = {}
+    for row in cursor.fetchall():
+        guidelines_by_lender.setdefault(row['lender_id'], []).append(CompiledGuideline(row))
+
+    cursor.execute('SELECT * FROM lenders')
+    return tuple(
+        CompiledLender(row, guidelines_by_lender[row['lender_id']])
+        for row in cursor.fetchall()
+        if row['lender_id'] in guidelines_by_lender
+    )
+
+class LenderCatalog:
+    """Per-worker cache of compiled lenders that refreshes on change.
+
+    Freshness is checked with two signals. ``PRAGMA data_version`` is read on
+    every access and only changes when another connection commits to the
+    database file. When it does, a watermark of row counts, highest rowid and
+    latest ``updated_at`` of both lender tables decides whether to reload.
+    Writers that edit guideline rows in place should bump ``updated_at`` (or
+    call ``invalidate``) so the change is picked up.
+    """
+
+    def __init__(self, db_path, pragmas=None, trace_callback=None):
+        self.db_path = db_path
+        self.pragmas = pragmas
+        # Optional sqlite3 trace callback, e.g. to count the catalog's queries
+        self.trace_callback = trace_callback
+        self.conn = None
+        self.load_count = 0
+        self._lenders = None
+        self._data_version = None
+        self._watermark = None
+        self._derived = {}
+        # Re-entrant so derived structures can be built from other derived structures
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+            apply_pragmas(self.conn, self.pragmas)
+            if self.trace_callback is not None:
+                self.conn.set_trace_callback(self.trace_callback)
+        return self.conn
+
+    def _read_watermark(self, conn):
+        watermark = []
+        for table in ('lenders', 'lender_guidelines'):
+            row = conn.execute(f'SELECT COUNT(*), MAX(rowid), MAX(updated_at) FROM {table}').fetchone()
+            watermark.extend(row)
+        return tuple(watermark)
+
+    def get_lenders(self):
+        """Return the compiled lenders, reloading them first if stale."""
+        with self._lock:
+            conn = self._connect()
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if self._lenders is not None and data_version == self._data_version:
+                return self._lenders
+
+            watermark = self._read_watermark(conn)
+            if self._lenders is None or watermark != self._watermark:
+                self._lenders = load_compiled_lenders(conn)
+                self.load_count += 1
+            self._data_version = data_version
+            self._watermark = watermark
+            return self._lenders
+
+    def get_derived(self, name, build):
+        """Return a structure built from the current lenders, cached by name.
+
+        ``build`` is called with the compiled lenders and its result is reused
+        until the catalog reloads.
+        """
+        lenders = self.get_lenders()
+        with self._lock:
+            cached = self._derived.get(name)
+            if cached is None or cached[0] is not lenders:
+                cached = (lenders, build(lenders))
+                self._derived[name] = cached
+            return cached[1]
+
+    def get_lender(self, lender_id):
+        """Return the current compiled lender with this ID, or None."""
+        lenders_by_id = self.get_derived('lenders_by_id', lambda lenders: {lender.lender_id: lender for lender in lenders})
+        return lenders_by_id.get(lender_id)
+
+    def invalidate(self):
+        """Drop the cached lenders so the next access reloads them."""
+        with self._lock:
+            self._lenders = None
+
+    def close(self):
+        with self._lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+            self._lenders = None
+            self._derived.clear()
@@ -0,0 +1,352 @@
+"""
+Bulk lender import script for BrokerBuddy application.
+This script streams lender programs from a CSV rate sheet, a JSONL file or an
+old BrokerBuddy database into the lenders and lender_guidelines tables.
+
+Rows are read one at a time and written with executemany in chunked
+transactions, so large partner rate sheets import without holding the whole
+file in memory. Lenders are matched to existing rows by name and program
+type; by default a re-imported lender's guidelines are replaced, and its
+updated_at is bumped so rematch_lenders.py picks up the change.
+
+CSV and JSONL rows use the lenders and lender_guidelines column names
+(name, program_type, min_credit_score, equipment_types, ...). A JSONL object
+may instead list its guideline rows under "guidelines".
+
+Usage:
+    python lender_import.py rate_sheet.csv
+    python lender_import.py lenders.jsonl --append
+    python lender_import.py old_brokerbuddy.db
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from client_profile import parse_credit_score, parse_time_in_business
+
+# Get database path from environment variable or use default
+DB_PATH = os.environ.get('DATABASE_PATH', 'brokerbuddy.db')
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 5000))
+
+LENDER_FIELDS = ('name', 'program_type', 'description', 'website', 'contact_email', 'contact_phone')
+GUIDELINE_FIELDS = (
+    'min_credit_score', 'min_time_in_business', 'min_monthly_revenue', 'min_equipment_cost',
+    'max_equipment_cost', 'equipment_types', 'industries_accepted', 'industries_restricted',
+    'funding_speed', 'rate_range', 'term_range', 'advance_rate'
+)
+
+def log(message):
+    """Simple logging function"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+def _value(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+def split_record(row):
+    """Split a flat row into (lender, guideline) dicts, with blank values as None."""
+    lender = {field: _value(row.get(field)) for field in LENDER_FIELDS}
+    if lender['name'] is None:
+        lender['name'] = _value(row.get('lender_name'))
+    guideline = {field: _value(row.get(field)) for field in GUIDELINE_FIELDS}
+    return lender, guideline
+
+def iter_csv_records(path):
+    """Stream (lender, guideline) records from a CSV file with a header row."""
+    # utf-8-sig drops the byte order mark spreadsheet exports often start with
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield split_record(row)
+
+def iter_jsonl_records(path):
+    """Stream (lender, guideline) records from a file with one JSON object per line."""
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from None
+            guidelines = row.get('guidelines')
+            if guidelines is None:
+                yield split_record(row)
+                continue
+            lender, _ = split_record(row)
+            if not guidelines:
+                yield lender, None
+            for guideline in guidelines:
+                yield lender, split_record(guideline)[1]
+
+def parse_amount_range(value):
+    """Parse an amount range such as "$10k - $250k" to (min, max), or None."""
+    if '-' not in value:
+        return None
+    parts = value.replace('$', '').replace(',', '').replace('k', '000').replace('K', '000').split('-')
+    try:
+        return float(parts[0].strip()), float(parts[1].strip())
+    except (ValueError, IndexError):
+        return None
+
+# Guideline written for an old lender without criteria, as the old
+# import_existing_lenders did, so the lender stays in the catalog and matching
+OLD_DB_DEFAULT_GUIDELINE = {'min_credit_score': 0, 'min_time_in_business': 0, 'equipment_types': ''}
+
+def convert_old_criteria(criteria):
+    """Map an old lender's (category name, value) criteria to guideline fields.
+
+    A lender without any usable criteria gets OLD_DB_DEFAULT_GUIDELINE.
+    """
+    guideline = dict.fromkeys(GUIDELINE_FIELDS)
+    for category_name, value in criteria:
+        if not value:
+            continue
+        if category_name == 'personal_credit':
+            guideline['min_credit_score'] = parse_credit_score(value) or None
+        elif category_name == 'time_in_business':
+            guideline['min_time_in_business'] = parse_time_in_business(value) or None
+        elif category_name == 'amount_considered':
+            amount_range = parse_amount_range(value)
+            if amount_range:
+                guideline['min_equipment_cost'], guideline['max_equipment_cost'] = amount_range
+        elif category_name in ('equipment_type', 'collateral_type'):
+            guideline['equipment_types'] = value
+    if all(value is None for value in guideline.values()):
+        guideline.update(OLD_DB_DEFAULT_GUIDELINE)
+    return guideline
+
+def iter_old_db_records(old_db_path):
+    """Stream (lender, guideline) records from an old BrokerBuddy database.
+
+    Lenders and their criteria are both read in lender order and merged, so
+    each lender's criteria are found without scanning the criteria table.
+    """
+    old_conn = sqlite3.connect(old_db_path)
+    old_conn.row_factory = sqlite3.Row
+    try:
+        lenders = old_conn.execute('SELECT * FROM lenders ORDER BY id')
+        criteria = old_conn.execute('''
+        SELECT lc.lender_id, cc.name, lc.value
+        FROM lender_criteria lc JOIN criteria_categories cc ON cc.id = lc.category_id
+        ORDER BY lc.lender_id, lc.rowid
+        ''')
+        pending = criteria.fetchone()
+        for old_lender in lenders:
+            keys = old_lender.keys()
+            lender_criteria = []
+            while pending is not None and pending['lender_id'] <= old_lender['id']:
+                if pending['lender_id'] == old_lender['id']:
+                    lender_criteria.append((pending['name'], pending['value']))
+                pending = criteria.fetchone()
+            lender = {field: _value(old_lender[field]) if field in keys else None for field in LENDER_FIELDS}
+            yield lender, convert_old_criteria(lender_criteria)
+    finally:
+        old_conn.close()
+
+def iter_records(path, source_format=None):
+    """Stream records from a source file, choosing the reader by format or extension."""
+    if source_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        source_format = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension, 'db')
+    if source_format == 'csv':
+        return iter_csv_records(path)
+    if source_format == 'jsonl':
+        return iter_jsonl_records(path)
+    if source_format == 'db':
+        return iter_old_db_records(path)
+    raise ValueError(f"Unknown import format: {source_format}")
+
+class LenderImporter:
+    """Writes (lender, guideline) records to the lender tables in chunks.
+
+    Works with the app schema (simple_reset_db.py) and the older schema
+    created by BrokerBuddyDB.initialize_database, which keys lenders by id,
+    has no program_type and keeps the amount range on the lender.
+    """
+
+    def __init__(self, conn, chunk_size=IMPORT_CHUNK_SIZE, replace=True, progress=log):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        # Replace the guidelines of lenders that already exist, rather than adding to them
+        self.replace = replace
+        self.progress = progress
+
+        lender_columns = {row[1] for row in conn.execute('PRAGMA table_info(lenders)').fetchall()}
+        guideline_columns = {row[1] for row in conn.execute('PRAGMA table_info(lender_guidelines)').fetchall()}
+        self.legacy = 'lender_id' not in lender_columns
+        self.key_column = 'id' if self.legacy else 'lender_id'
+        self.guideline_fields = [field for field in GUIDELINE_FIELDS if field in guideline_columns]
+        # Replacing guidelines deletes them by lender_id
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_lender_guidelines_lender_id ON lender_guidelines (lender_id)')
+        conn.commit()
+        if self.legacy:
+            self.lender_columns = ['name', 'description', 'min_amount', 'max_amount', 'active']
+            program_column = 'description'
+        else:
+            self.lender_columns = list(LENDER_FIELDS)
+            program_column = 'program_type'
+
+        # Existing lenders by (name, program type); looked up for every record
+        cursor = conn.execute(f'SELECT {self.key_column}, name, {program_column} FROM lenders')
+        self.lender_ids = {self._key(name, program): lender_id for lender_id, name, program in cursor.fetchall()}
+        # Lenders created or updated by this import; later records only add guidelines
+        self.touched = set()
+        self.stats = {'rows': 0, 'lenders_created': 0, 'lenders_updated': 0, 'guidelines': 0, 'skipped': 0}
+
+    @staticmethod
+    def _key(name, program_type):
+        return (name or '').casefold(), (program_type or '').casefold()
+
+    def _lender_key(self, lender):
+        # The old schema stores the program type as the description
+        program_type = lender['description'] or lender['program_type'] if self.legacy else lender['program_type']
+        return self._key(lender['name'], program_type)
+
+    def _lender_values(self, lender, guideline):
+        if self.legacy:
+            guideline = guideline or {}
+            return (lender['name'], lender['description'] or lender['program_type'],
+                    guideline.get('min_equipment_cost'), guideline.get('max_equipment_cost'), 1)
+        return tuple(lender[field] for field in LENDER_FIELDS)
+
+    def run(self, records):
+        """Import records in chunked transactions; return the import stats."""
+        started = time.perf_counter()
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                self._write_chunk(chunk)
+                chunk = []
+                self._report(started)
+        if chunk:
+            self._write_chunk(chunk)
+        self.stats['seconds'] = round(time.perf_counter() - started, 3)
+        self._report(started, done=True)
+        return self.stats
+
+    def _report(self, started, done=False):
+        if self.progress is None:
+            return
+        elapsed = time.perf_counter() - started
+        rate = self.stats['rows'] / elapsed if elapsed else 0
+        self.progress(
+            f"{'Imported' if done else 'Importing'}: {self.stats['rows']:,} rows, "
+            f"{self.stats['lenders_created']:,} lenders created, {self.stats['lenders_updated']:,} updated, "
+            f"{self.stats['guidelines']:,} guidelines, {self.stats['skipped']:,} skipped "
+            f"({rate:,.0f} rows/s)"
+        )
+
+    def _next_lender_id(self):
+        row = self.conn.execute(f'SELECT MAX({self.key_column}) FROM lenders').fetchone()
+        next_id = (row[0] or 0) + 1
+        # AUTOINCREMENT never reuses the IDs of deleted lenders, so neither do we
+        try:
+            row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'lenders'").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row is not None and row[0] is not None:
+            next_id = max(next_id, row[0] + 1)
+        return next_id
+
+    def _write_chunk(self, chunk):
+        now = datetime.now().isoformat()
+        # Hold the write lock for the chunk so the lender IDs assigned below stay free
+        self.conn.commit()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            next_id = self._next_lender_id()
+            inserts, updates, replaced, guidelines = [], [], [], []
+            for lender, guideline in chunk:
+                self.stats['rows'] += 1
+                if not lender['name']:
+                    self.stats['skipped'] += 1
+                    continue
+                key = self._lender_key(lender)
+                lender_id = self.lender_ids.get(key)
+                if lender_id is None:
+                    lender_id = next_id
+                    next_id += 1
+                    self.lender_ids[key] = lender_id
+                    self.touched.add(lender_id)
+                    inserts.append((lender_id,) + self._lender_values(lender, guideline) + (now, now))
+                elif lender_id not in self.touched:
+                    self.touched.add(lender_id)
+                    updates.append(self._lender_values(lender, guideline) + (now, lender_id))
+                    if self.replace:
+                        replaced.append((lender_id,))
+                # A record without guideline values (e.g. a lender-only CSV row) adds no guideline row
+                if guideline and any(value is not None for value in guideline.values()):
+                    guidelines.append((lender_id,) + tuple(guideline[field] for field in self.guideline_fields) + (now, now))
+
+            cursor = self.conn.cursor()
+            columns = ', '.join(self.lender_columns)
+            cursor.executemany(f'''
+            INSERT INTO lenders ({self.key_column}, {columns}, created_at, updated_at)
+            VALUES ({', '.join('?' * (len(self.lender_columns) + 3))})
+            ''', inserts)
+            # Fields missing from the source keep their current values
+            assignments = ', '.join(f'{column} = COALESCE(?, {column})' for column in self.lender_columns)
+            cursor.executemany(f'''
+            UPDATE lenders SET {assignments}, updated_at = ? WHERE {self.key_column} = ?
+            ''', updates)
+            cursor.executemany('DELETE FROM lender_guidelines WHERE lender_id = ?', replaced)
+            columns = ', '.join(self.guideline_fields)
+            cursor.executemany(f'''
+            INSERT INTO lender_guidelines (lender_id, {columns}, created_at, updated_at)
+            VALUES ({', '.join('?' * (len(self.guideline_fields) + 3))})
+            ''', guidelines)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        self.stats['lenders_created'] += len(inserts)
+        self.stats['lenders_updated'] += len(updates)
+        self.stats['guidelines'] += len(guidelines)
+
+def import_lenders(path, source_format=None, replace=True, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import lenders from a source file into the database at DB_PATH"""
+    log(f"Importing lenders from {path} into {DB_PATH}")
+    if not os.path.exists(path):
+        log(f"Source file does not exist: {path}")
+        return False
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        importer = LenderImporter(conn, chunk_size=chunk_size, replace=replace)
+        importer.run(iter_records(path, source_format))
+        return True
+    except Exception as e:
+        log(f"Error importing lenders: {e}")
+        return False
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import lenders from CSV, JSONL or an old database")
+    parser.add_argument('source', help="CSV, JSONL (.jsonl/.ndjson) or SQLite database file")
+    parser.add_argument('--format', choices=('csv', 'jsonl', 'db'), dest='source_format',
+                        help="Source format; inferred from the file extension by default")
+    parser.add_argument('--append', action='store_true',
+                        help="Add guidelines to existing lenders instead of replacing them")
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+                        help="Rows written per transaction")
+    args = parser.parse_args()
+
+    log("Starting lender import")
+    if not import_lenders(args.source, args.source_format, replace=not args.append, chunk_size=args.chunk_size):
+        log("Lender import failed")
+        sys.exit(1)
+    log("Lender import completed")
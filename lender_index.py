@@ -0,0 +1,151 @@
+"""
+Lender lookup indexes for the BrokerBuddy matching engine.
+
+Built from a compiled scoring plan, these map client values to the guideline
+rows (and lender IDs) that accept them, so candidate lenders are found with
+set operations and binary searches instead of scanning every guideline.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it LenderRangeIndex is unavailable
+    np = None
+
+class TermIndex:
+    """Inverted index over one comma-separated guideline field.
+
+    Each normalized term maps to the set of guidelines listing it, and
+    guidelines that accept every value (``all`` or an empty term) sit in a
+    separate bucket. Matching keeps the engine's substring semantics: a
+    guideline accepts a client value when any of its terms occurs in the
+    lowercased value. A lookup therefore checks each distinct term once,
+    rather than every guideline's terms, and is memoized per client value.
+    """
+
+    MEMO_SIZE = 1024
+
+    def __init__(self, entries):
+        # entries are (guideline, compiled terms) pairs, where the compiled
+        # terms are (terms, accepts_all), or None if the field is unset
+        self.postings = {}
+        self.accepts_all = set()
+        unconstrained = set()
+        for guideline, compiled in entries:
+            if compiled is None:
+                unconstrained.add(guideline)
+                continue
+            terms, accepts_all = compiled
+            if accepts_all:
+                self.accepts_all.add(guideline)
+            for term in terms:
+                self.postings.setdefault(term, set()).add(guideline)
+        self.unconstrained = frozenset(unconstrained)
+        self._memo = {}
+
+    def matching(self, client_value):
+        """Return the guidelines accepting a lowercased client value."""
+        matched = self._memo.get(client_value)
+        if matched is None:
+            matched = set(self.accepts_all)
+            for term, guidelines in self.postings.items():
+                if term in client_value:
+                    matched |= guidelines
+            matched = frozenset(matched)
+            if len(self._memo) >= self.MEMO_SIZE:
+                self._memo.clear()
+            self._memo[client_value] = matched
+        return matched
+
+    def eligible(self, client_value):
+        """Return the guidelines that do not reject a client value.
+
+        That is every guideline without this criterion, plus those accepting
+        the value.
+        """
+        return self.matching(client_value) | self.unconstrained
+
+class ThresholdIndex:
+    """Guideline positions sorted by one numeric threshold.
+
+    Guidelines without the threshold are kept out of the sorted arrays and
+    flagged in ``unconstrained``. Lookups are binary searches that return a
+    slice of positions.
+    """
+
+    def __init__(self, thresholds, present):
+        positions = np.flatnonzero(present)
+        order = np.argsort(thresholds[positions], kind='stable')
+        self.positions = positions[order]
+        self.sorted_thresholds = thresholds[positions][order]
+        self.unconstrained = ~present
+
+    def at_most(self, value):
+        """Positions whose threshold is <= value."""
+        return self.positions[:np.searchsorted(self.sorted_thresholds, value, side='right')]
+
+    def at_least(self, value):
+        """Positions whose threshold is >= value."""
+        return self.positions[np.searchsorted(self.sorted_thresholds, value, side='left'):]
+
+class LenderRangeIndex:
+    """Sorted threshold indexes for finding fully matching lenders.
+
+    Built from LenderColumns. A guideline fully matches a client when every
+    weighted criterion that applies to both passes (a 100% score), so the
+    eligible set is found by intersecting binary-search lookups on the
+    numeric requirements with the term and value columns, without scoring
+    any lender. Rules without weight cannot lower a score and are skipped.
+    """
+
+    def __init__(self, columns):
+        if np is None:
+            raise RuntimeError("NumPy is required for the range index")
+
+        self.columns = columns
+        self.lender_ids = np.array([lender.lender_id for lender in columns.lenders])
+        self.lookups = []
+        for column in columns.columns:
+            if not column.rule.weight:
+                continue
+            if column.rule.operator == 'at_least':
+                indexes = (ThresholdIndex(column.minimum, column.present),)
+            elif column.rule.operator == 'between':
+                indexes = (ThresholdIndex(column.minimum, column.present),
+                           ThresholdIndex(column.maximum, column.present))
+            else:
+                indexes = ()
+            self.lookups.append((column, indexes))
+
+    def _passing(self, column, indexes, value):
+        if column.rule.operator == 'at_least':
+            passing = indexes[0].unconstrained.copy()
+            passing[indexes[0].at_most(value)] = True
+            return passing
+        if column.rule.operator == 'between':
+            above_min = np.zeros(self.columns.rows, dtype=bool)
+            above_min[indexes[0].at_most(value)] = True
+            below_max = np.zeros(self.columns.rows, dtype=bool)
+            below_max[indexes[1].at_least(value)] = True
+            return indexes[0].unconstrained | (above_min & below_max)
+        return ~column.present | column.passes(value)
+
+    def eligible_lender_ids(self, profile):
+        """Return IDs of lenders with a guideline a ClientProfile fully matches.
+
+        IDs are returned in catalog order.
+        """
+        eligible = np.ones(self.columns.rows, dtype=bool)
+        applicable = np.zeros(self.columns.rows, dtype=bool)
+
+        for column, indexes in self.lookups:
+            value = getattr(profile, column.rule.client_field)
+            if value is None:
+                continue
+            eligible &= self._passing(column, indexes, value)
+            applicable |= column.present
+
+        # A guideline with no applicable criterion has no score, so it cannot match
+        eligible &= applicable
+        if not len(self.lender_ids):
+            return []
+        return self.lender_ids[np.logical_or.reduceat(eligible, self.columns.lender_starts)].tolist()
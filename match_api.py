@@ -0,0 +1,135 @@
+"""
+JSON serialization for the BrokerBuddy matching API.
+
+POST /api/match returns ranked matches as JSON without the form, session and
+template round trip. Responses are encoded with orjson when it is installed
+(falling back to the standard library), carry only the requested match
+fields, and are gzip-compressed for clients that accept it.
+"""
+
+import gzip
+import json
+import zlib
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is used without it
+    orjson = None
+
+from flask import Response
+
+# Fields a match may be serialized with; match_details is rendered as
+# {'criterion', 'result', 'reason'} dicts
+MATCH_FIELDS = ('lender_id', 'lender_name', 'description', 'match_score', 'match_details')
+
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+
+class APIError(Exception):
+    """A request error reported to the caller as a JSON body with `status`."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def dumps(value):
+    """Encode a value as compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+def read_json(request):
+    """Decode the request body as JSON, accepting a gzip-encoded body.
+
+    The body, and the body after decompression, may be at most
+    MAX_CONTENT_LENGTH bytes; larger ones are rejected with a 413.
+    """
+    max_size = request.max_content_length
+    if max_size is not None and (request.content_length or 0) > max_size:
+        raise APIError("Request body is too large", 413)
+    if max_size is not None:
+        # Bounded read, as a body without a Content-Length may be streamed
+        body = request.stream.read(max_size + 1)
+        if len(body) > max_size:
+            raise APIError("Request body is too large", 413)
+    else:
+        body = request.get_data(cache=False)
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        body = gunzip(body, max_size)
+    try:
+        return orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError:
+        raise APIError("Request body must be JSON")
+
+def gunzip(data, max_size=None):
+    """Decompress gzip data, raising a 413 APIError once it grows past `max_size` bytes.
+
+    Only max_size + 1 bytes are ever inflated, so a small body that expands
+    to gigabytes is refused without being decompressed.
+    """
+    output = b''
+    # A gzip body may hold several members, as gzip.decompress() accepts
+    while data:
+        decompressor = zlib.decompressobj(wbits=31)
+        # max_length=0 means no cap
+        max_length = max_size + 1 - len(output) if max_size is not None else 0
+        try:
+            output += decompressor.decompress(data, max_length)
+        except zlib.error:
+            raise APIError("Request body is not valid gzip data")
+        if max_size is not None and len(output) > max_size:
+            raise APIError("Request body is too large", 413)
+        if not decompressor.eof:
+            raise APIError("Request body is not valid gzip data")
+        data = decompressor.unused_data
+    return output
+
+def parse_fields(value):
+    """Parse a `fields` parameter (comma-separated string or list) to a tuple of match fields."""
+    if value is None or value == '':
+        return MATCH_FIELDS
+    if isinstance(value, str):
+        value = [field.strip() for field in value.split(',') if field.strip()]
+    if not isinstance(value, list) or not all(isinstance(field, str) for field in value):
+        raise APIError("fields must be a list or comma-separated string of field names")
+    unknown = [field for field in value if field not in MATCH_FIELDS]
+    if unknown:
+        raise APIError(f"Unknown fields: {', '.join(unknown)}; expected any of {', '.join(MATCH_FIELDS)}")
+    return tuple(value)
+
+def parse_limit(value, max_limit):
+    """Parse a `limit` parameter to an int between 1 and `max_limit`, or None if absent."""
+    if value is None or value == '':
+        return None
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise APIError("limit must be an integer")
+    if limit < 1 or limit > max_limit:
+        raise APIError(f"limit must be between 1 and {max_limit}")
+    return limit
+
+def serialize_match(match, fields):
+    """Return a match as a dict holding only `fields`."""
+    result = {}
+    for field in fields:
+        if field == 'match_details':
+            result[field] = [
+                detail.to_dict() if hasattr(detail, 'to_dict') else detail
+                for detail in match['match_details']
+            ]
+        else:
+            result[field] = match[field]
+    return result
+
+def json_response(value, request, status=200):
+    """Build a JSON response, gzip-compressed when the client accepts it and it is large enough."""
+    body = dumps(value)
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) >= GZIP_MIN_SIZE and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
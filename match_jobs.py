@@ -0,0 +1,203 @@
+"""
+Background match jobs for the BrokerBuddy application.
+
+With MATCH_PIPELINE='async', a client submission only inserts the client
+row and a match_jobs row in one transaction, then redirects. A per-worker
+MatchJobRunner scores and saves the matches on background threads, and
+/find-lenders shows a waiting page that polls until the job has finished.
+
+Jobs live in the match_jobs table rather than only in an in-process queue,
+so any gunicorn worker can report a job's status, and a job left behind by
+a worker that exited or crashed is picked up by another worker's runner.
+Runners claim a job with a conditional UPDATE, so each job runs once. A
+finished job's row is deleted after its matches are saved, so the table
+only holds pending, running and failed jobs, and a client without a row
+has its matches in the matches table.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database_schema import apply_pragmas
+from matching_engine import write_match_results
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_FAILED = 'failed'
+
+# Runs of a job before it is marked failed
+MAX_ATTEMPTS = 3
+
+def ensure_job_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS match_jobs (
+        client_id INTEGER PRIMARY KEY,
+        status TEXT NOT NULL,
+        client_data TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_match_jobs_status ON match_jobs (status, updated_at)')
+    conn.commit()
+
+def enqueue_job(conn, client_id, client_data):
+    """Add a pending job for a client, in the caller's transaction.
+
+    The submitted client data is stored with the job, so the job scores
+    exactly what was submitted without reading the clients row back.
+    """
+    now = datetime.now().isoformat()
+    conn.execute('''
+    INSERT OR REPLACE INTO match_jobs (client_id, status, client_data, attempts, error, created_at, updated_at)
+    VALUES (?, ?, ?, 0, NULL, ?, ?)
+    ''', (client_id, JOB_PENDING, json.dumps(client_data), now, now))
+
+def get_job_status(conn, client_id):
+    """Return (status, error) for a client's unfinished job, or None when there is none."""
+    row = conn.execute('SELECT status, error FROM match_jobs WHERE client_id = ?', (client_id,)).fetchone()
+    return (row[0], row[1]) if row is not None else None
+
+def claim_job(conn, client_id=None, stale_after=300):
+    """Mark a job running and return (client_id, client_data, attempts), or None.
+
+    Claims the given client's job, or else the oldest pending one. Jobs left
+    running for more than `stale_after` seconds are claimed again.
+    """
+    now = datetime.now()
+    stale = (now - timedelta(seconds=stale_after)).isoformat()
+    claimable = "(status = 'pending' OR (status = 'running' AND updated_at < ?))"
+    if client_id is None:
+        row = conn.execute(
+            f'SELECT client_id FROM match_jobs WHERE {claimable} ORDER BY created_at LIMIT 1', (stale,)
+        ).fetchone()
+        if row is None:
+            return None
+        client_id = row[0]
+    cursor = conn.execute(f'''
+    UPDATE match_jobs SET status = ?, attempts = attempts + 1, updated_at = ?
+    WHERE client_id = ? AND {claimable}
+    ''', (JOB_RUNNING, now.isoformat(), client_id, stale))
+    if cursor.rowcount == 0:
+        # Another runner claimed it first
+        conn.commit()
+        return None
+    row = conn.execute('SELECT client_data, attempts FROM match_jobs WHERE client_id = ?', (client_id,)).fetchone()
+    conn.commit()
+    return client_id, json.loads(row[0]), row[1]
+
+class MatchJobRunner:
+    """Runs match jobs from the match_jobs table on background threads.
+
+    submit() wakes a thread for a job the caller has just committed. Idle
+    threads also poll the table every `poll_interval` seconds for jobs no
+    runner has taken, such as those of a worker that has gone away.
+    `make_engine(conn)` builds the MatchingEngine for a job, and
+    `on_done(client_id, client_data, matches, seconds)` is called after a
+    job's matches are saved.
+    """
+
+    def __init__(self, db_path, make_engine, pragmas=None, workers=2, poll_interval=5.0, stale_after=300,
+                 on_done=None):
+        self.db_path = db_path
+        self.make_engine = make_engine
+        self.pragmas = pragmas
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.on_done = on_done
+        self.pid = os.getpid()
+        self.completed = 0
+        self.failed = 0
+
+        conn = self._connect()
+        try:
+            ensure_job_table(conn)
+        finally:
+            conn.close()
+
+        self._queue = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'match-job-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        apply_pragmas(conn, self.pragmas)
+        return conn
+
+    def submit(self, client_id):
+        self._queue.put(client_id)
+
+    def close(self):
+        """Stop the threads once they finish their current jobs; queued jobs stay pending."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                try:
+                    client_id = self._queue.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    client_id = 0
+                if client_id is None:
+                    return
+                try:
+                    # Run the woken job, then any others waiting in the table
+                    job = claim_job(conn, client_id or None, self.stale_after)
+                    while job is not None:
+                        self._execute(conn, *job)
+                        job = claim_job(conn, None, self.stale_after)
+                except Exception:
+                    # e.g. a locked database; unclaimed jobs are retried on the next poll
+                    logger.exception("Error running match jobs")
+                    conn.rollback()
+        finally:
+            conn.close()
+
+    def _execute(self, conn, client_id, client_data, attempts):
+        started = time.perf_counter()
+        try:
+            engine = self.make_engine(conn)
+            matches = engine.find_matching_lenders(client_data)
+            if not write_match_results(conn, client_id, matches):
+                raise RuntimeError("match results could not be saved")
+        except Exception as e:
+            conn.rollback()
+            status = JOB_FAILED if attempts >= MAX_ATTEMPTS else JOB_PENDING
+            conn.execute('UPDATE match_jobs SET status = ?, error = ?, updated_at = ? WHERE client_id = ?',
+                         (status, str(e), datetime.now().isoformat(), client_id))
+            conn.commit()
+            if status == JOB_FAILED:
+                self.failed += 1
+            logger.error("Match job for client %s failed (attempt %s): %s", client_id, attempts, e)
+            return
+
+        # The matches are committed before the job row goes, so a client is never
+        # without both a job and saved matches
+        conn.execute('DELETE FROM match_jobs WHERE client_id = ?', (client_id,))
+        conn.commit()
+        self.completed += 1
+        seconds = time.perf_counter() - started
+        logger.debug("Matched client %s: %s lenders in %.3fs", client_id, len(matches), seconds)
+        if self.on_done is not None:
+            self.on_done(client_id, client_data, matches, seconds)
@@ -0,0 +1,117 @@
+"""
+Match details for the BrokerBuddy matching engine.
+
+Scoring records each criterion as a compact MatchDetail (criterion, whether
+it matched, the client value and the lender threshold). The human-readable
+reason is only formatted when a page or export reads it, so lenders that are
+scored but never displayed cost no string formatting. Details are saved to
+the matches table as JSON lists in the same compact form.
+"""
+
+from collections import namedtuple
+
+def _money(value):
+    return f"${value:,.2f}"
+
+# Reason templates per criterion, as (match, no match) pairs
+_REASONS = {
+    'credit_score': (
+        "Client's credit score ({client}) meets requirement ({threshold})",
+        "Client's credit score ({client}) is below requirement ({threshold})"
+    ),
+    'time_in_business': (
+        "Client's time in business ({client} months) meets requirement ({threshold} months)",
+        "Client's time in business ({client} months) is below requirement ({threshold} months)"
+    ),
+    'loan_amount': (
+        "Client's equipment cost ({client}) is within range ({minimum} - {maximum})",
+        "Client's equipment cost ({client}) is outside range ({minimum} - {maximum})"
+    ),
+    'equipment_type': (
+        "Client's equipment type ({client}) is accepted",
+        "Client's equipment type ({client}) is not accepted"
+    ),
+    'industry': (
+        "Client's industry ({client}) is accepted",
+        "Client's industry ({client}) is not accepted"
+    ),
+    'monthly_revenue': (
+        "Client's monthly revenue ({client}) meets requirement ({threshold})",
+        "Client's monthly revenue ({client}) is below requirement ({threshold})"
+    ),
+    'working_capital': (
+        "Lender offers working capital",
+        "Lender does not offer working capital"
+    ),
+}
+
+# Criteria whose client value and threshold are shown as currency
+_MONEY_CRITERIA = frozenset(('loan_amount', 'monthly_revenue'))
+
+def render_reason(criterion, matched, client_value, threshold):
+    """Format the human-readable reason for one criterion result."""
+    if criterion in _MONEY_CRITERIA:
+        client_value = _money(client_value)
+        if isinstance(threshold, (tuple, list)):
+            threshold = tuple(_money(value) for value in threshold)
+        elif threshold is not None:
+            threshold = _money(threshold)
+
+    templates = _REASONS.get(criterion)
+    if templates is None:
+        # Criteria added through custom scoring rules
+        label = criterion.replace('_', ' ')
+        if threshold is None:
+            return f"Client's {label} ({client_value}) is {'accepted' if matched else 'not accepted'}"
+        return f"Client's {label} ({client_value}) {'meets' if matched else 'does not meet'} requirement ({threshold})"
+
+    template = templates[0] if matched else templates[1]
+    if isinstance(threshold, (tuple, list)):
+        minimum, maximum = threshold
+        return template.format(client=client_value, minimum=minimum, maximum=maximum)
+    return template.format(client=client_value, threshold=threshold)
+
+class MatchDetail(namedtuple('MatchDetail', ['criterion', 'matched', 'client_value', 'threshold'])):
+    """One criterion's outcome for a lender, with its reason rendered on demand.
+
+    ``threshold`` is the lender's minimum, a (min, max) pair for the loan
+    amount, or None for term criteria. ``result`` and ``reason`` give the
+    same values as the dicts the engine used to build, and ``get`` allows
+    dict-style access for code written against those.
+    """
+
+    __slots__ = ()
+
+    @property
+    def result(self):
+        return 'Match' if self.matched else 'No Match'
+
+    @property
+    def reason(self):
+        return render_reason(self.criterion, self.matched, self.client_value, self.threshold)
+
+    def get(self, key, default=None):
+        if key in ('criterion', 'result', 'reason'):
+            return getattr(self, key)
+        return default
+
+    def to_dict(self):
+        """Return the detail as a {'criterion', 'result', 'reason'} dict, e.g. for exports."""
+        return {'criterion': self.criterion, 'result': self.result, 'reason': self.reason}
+
+def load_match_details(stored):
+    """Rebuild match details from their saved JSON value.
+
+    Compact details are saved as lists; rows written before that hold
+    {'criterion', 'result', 'reason'} dicts, which are returned unchanged.
+    """
+    details = []
+    for detail in stored:
+        if isinstance(detail, list):
+            criterion, matched, client_value, threshold = detail
+            if isinstance(threshold, list):
+                threshold = tuple(threshold)
+            details.append(MatchDetail(criterion, matched, client_value, threshold))
+        else:
+            details.append(detail)
+    return details
@@ -1,240 +1,349 @@
+import atexit
+import heapq
+import queue
 import sqlite3
 import json
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
 from datetime import datetime
 
-def safe_convert_to_number(value):
-    if value is None:
-        return 0
-    if isinstance(value, (int, float)):
-        return value
-    if isinstance(value, str):
-        clean_value = ''.join(c for c in value if c.isdigit() or c == '.')
-        if not clean_value:
-            return 0
-        try:
-            return float(clean_value)
-        except (ValueError, TypeError):
-            return 0
-    return 0
+from database_schema import apply_pragmas
+
+from client_profile import ClientProfile, parse_credit_score, parse_time_in_business, safe_convert_to_number
+from lender_catalog import load_compiled_lenders
+from lender_index import LenderRangeIndex
+from scoring_rules import DEFAULT_RULE_SET
+from vectorized_scoring import HAS_NUMPY, LenderColumns, rank_lenders
+
+logger = logging.getLogger(__name__)
 
 class MatchingEngine:
-    def __init__(self, db_connection):
+    def __init__(self, db_connection, catalog=None, vectorized=False, limit=None, min_score=0, rules=None,
+                 knockout=False):
         self.conn = db_connection
         self.conn.row_factory = sqlite3.Row
+        # Optional LenderCatalog; without one, lenders are loaded per call.
+        self.catalog = catalog
+        # Score all lenders at once with NumPy arrays when it is installed
+        self.vectorized = vectorized and HAS_NUMPY
+        # Keep only the best `limit` matches scoring at least `min_score`
+        self.limit = limit
+        self.min_score = min_score
+        # scoring_rules.RuleSet declaring the criteria and weights
+        self.rules = rules if rules is not None else DEFAULT_RULE_SET
+        # Treat the rule set's knockout criteria as hard filters, evaluated first
+        self.knockout = knockout
+        # Lenders knocked out so far, by the criterion that knocked them out
+        self.knockouts = Counter()
+        # Lenders scored so far, summed over every client matched
+        self.lenders_scanned = 0
 
-    def find_matching_lenders(self, client_data):
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM lenders')
-        lenders = cursor.fetchall()
+    def _get_lenders(self):
+        if self.catalog is not None:
+            return self.catalog.get_lenders()
+        return load_compiled_lenders(self.conn)
 
-        matches = []
+    # Structures compiled from the lenders are cached per rule set on the catalog
+    def _get_plan(self, lenders):
+        if self.catalog is not None:
+            return self.catalog.get_derived(('plan', self.rules), self.rules.compile)
+        return self.rules.compile(lenders)
 
-        for lender in lenders:
-            cursor.execute('SELECT * FROM lender_guidelines WHERE lender_id = ?', (lender['lender_id'],))
-            guidelines = cursor.fetchone()
+    def _get_columns(self, lenders):
+        if self.catalog is not None:
+            return self.catalog.get_derived(('columns', self.rules), lambda lenders: LenderColumns(self._get_plan(lenders)))
+        return LenderColumns(self._get_plan(lenders))
 
-            if not guidelines:
-                continue
+    def _get_range_index(self, lenders):
+        if self.catalog is not None:
+            return self.catalog.get_derived(('range_index', self.rules), lambda lenders: LenderRangeIndex(self._get_columns(lenders)))
+        return LenderRangeIndex(self._get_columns(lenders))
+
+    def eligible_lender_ids(self, client_data):
+        """Hard-filter mode: IDs of lenders the client fully matches.
+
+        Returns, in catalog order, the lenders that find_matching_lenders
+        would score 100, without scoring or building match details. Uses the
+        sorted threshold indexes when NumPy is available.
+        """
+        lenders = self._get_lenders()
+        profile = self._profile(client_data)
+        if HAS_NUMPY:
+            return self._get_range_index(lenders).eligible_lender_ids(profile)
+
+        plan = self._get_plan(lenders)
+        bound = plan.bind(profile)
+        return [lender.lender_id for lender in lenders if plan.lender_score(bound, lender) == 100]
+
+    def find_matching_lenders(self, client_data, limit=None, min_score=None):
+        """Return the client's matching lenders, best first.
+
+        ``client_data`` is a client dict or an already parsed ClientProfile.
+        ``limit`` and ``min_score`` override the engine defaults for this call.
+        """
+        limit = self.limit if limit is None else limit
+        min_score = self.min_score if min_score is None else min_score
+        profile = self._profile(client_data)
+        lenders = self._get_lenders()
+        self.lenders_scanned += len(lenders)
+        if self.vectorized:
+            columns = self._get_columns(lenders)
+            if self.knockout:
+                knocked, reasons = columns.knockouts([profile])
+                self._count_knockouts(columns, reasons)
+                scores = columns.score(profile, knocked[0])
+            else:
+                scores = columns.score(profile)
+            return self._ranked_matches(profile, columns, scores, limit, min_score)
+        return self._match_client(profile, self._get_plan(lenders), limit, min_score)
+
+    def match_many(self, clients, chunk_size=256, limit=None, min_score=None):
+        """Match a stream of clients against the lender catalog.
+
+        ``clients`` may be any iterable of client dicts, including a generator.
+        Lenders are loaded once for the whole batch. Yields a
+        ``(client_data, matches)`` pair per client, in input order, where
+        ``matches`` is what find_matching_lenders would return. In vectorized
+        mode clients are scored ``chunk_size`` at a time as a client x lender
+        matrix.
+        """
+        limit = self.limit if limit is None else limit
+        min_score = self.min_score if min_score is None else min_score
+        lenders = self._get_lenders()
+        if not self.vectorized:
+            plan = self._get_plan(lenders)
+            for client_data in clients:
+                self.lenders_scanned += len(lenders)
+                yield client_data, self._match_client(self._profile(client_data), plan, limit, min_score)
+            return
+
+        columns = self._get_columns(lenders)
+        chunk = []
+        for client_data in clients:
+            chunk.append(client_data)
+            if len(chunk) >= chunk_size:
+                yield from self._match_chunk(chunk, columns, limit, min_score)
+                chunk = []
+        if chunk:
+            yield from self._match_chunk(chunk, columns, limit, min_score)
 
-            result = self._calculate_match_score(client_data, lender, guidelines)
+    def _match_chunk(self, chunk, columns, limit, min_score):
+        profiles = [self._profile(client_data) for client_data in chunk]
+        self.lenders_scanned += len(chunk) * len(columns.lenders)
+        if self.knockout:
+            knocked, reasons = columns.knockouts(profiles)
+            self._count_knockouts(columns, reasons)
+            score_matrix = columns.score_many(profiles, knocked)
+        else:
+            score_matrix = columns.score_many(profiles)
+        for client_data, profile, scores in zip(chunk, profiles, score_matrix):
+            yield client_data, self._ranked_matches(profile, columns, scores, limit, min_score)
+
+    def _match_client(self, profile, plan, limit=None, min_score=0):
+        bound = plan.bind(profile)
+
+        if limit is not None:
+            return self._top_matches(plan, bound, limit, min_score)
+
+        matches = []
+
+        for lender in plan.lenders:
+            if self.knockout and self._knocked_out(plan, bound, lender):
+                continue
+            result = plan.lender_result(bound, lender, self.knockout)
             if result:
                 match_score, match_details = result
-                if match_score > 0:
-                    matches.append({
-                        'lender_id': lender['lender_id'],
-                        'lender_name': lender['name'],
-                        'description': lender['description'],
-                        'match_score': match_score,
-                        'match_details': match_details
-                    })
+                if match_score > 0 and match_score >= min_score:
+                    matches.append(self._build_match(lender, match_score, match_details))
 
         matches.sort(key=lambda x: x['match_score'], reverse=True)
         return matches
 
-    def _calculate_match_score(self, client_data, lender, guidelines):
-        match_details = []
-        total_score = 0
-        max_possible_score = 0
-
-        # Credit Score
-        if 'credit_score' in client_data and client_data['credit_score'] and guidelines['min_credit_score']:
-            max_possible_score += 25
-            client_credit = self._parse_credit_score(client_data['credit_score'])
-            min_credit = safe_convert_to_number(guidelines['min_credit_score'])
-
-            if client_credit >= min_credit:
-                total_score += 25
-                match_details.append({
-                    'criterion': 'credit_score',
-                    'result': 'Match',
-                    'reason': f"Client's credit score ({client_credit}) meets requirement ({min_credit})"
-                })
-            else:
-                match_details.append({
-                    'criterion': 'credit_score',
-                    'result': 'No Match',
-                    'reason': f"Client's credit score ({client_credit}) is below requirement ({min_credit})"
-                })
-
-        # Time in Business
-        if 'time_in_business' in client_data and client_data['time_in_business'] and guidelines['min_time_in_business']:
-            max_possible_score += 25
-            client_time = self._parse_time_in_business(client_data['time_in_business'])
-            min_time = safe_convert_to_number(guidelines['min_time_in_business'])
-
-            if client_time >= min_time:
-                total_score += 25
-                match_details.append({
-                    'criterion': 'time_in_business',
-                    'result': 'Match',
-                    'reason': f"Client's time in business ({client_time} months) meets requirement ({min_time} months)"
-                })
-            else:
-                match_details.append({
-                    'criterion': 'time_in_business',
-                    'result': 'No Match',
-                    'reason': f"Client's time in business ({client_time} months) is below requirement ({min_time} months)"
-                })
-
-        # Loan Amount (Equipment Cost)
-        if 'equipment_cost' in client_data and client_data['equipment_cost'] and guidelines['min_equipment_cost'] and guidelines['max_equipment_cost']:
-            max_possible_score += 25
-            client_amount = safe_convert_to_number(client_data['equipment_cost'])
-            min_amount = safe_convert_to_number(guidelines['min_equipment_cost'])
-            max_amount = safe_convert_to_number(guidelines['max_equipment_cost'])
-
-            if min_amount <= client_amount <= max_amount:
-                total_score += 25
-                match_details.append({
-                    'criterion': 'loan_amount',
-                    'result': 'Match',
-                    'reason': f"Client's equipment cost (${client_amount:,.2f}) is within range (${min_amount:,.2f} - ${max_amount:,.2f})"
-                })
-            else:
-                match_details.append({
-                    'criterion': 'loan_amount',
-                    'result': 'No Match',
-                    'reason': f"Client's equipment cost (${client_amount:,.2f}) is outside range (${min_amount:,.2f} - ${max_amount:,.2f})"
-                })
-
-        # Equipment Type
-        if 'equipment_type' in client_data and client_data['equipment_type'] and guidelines['equipment_types']:
-            max_possible_score += 15
-            equipment_types = str(guidelines['equipment_types']).lower().split(',')
-            client_equipment = str(client_data['equipment_type']).lower()
-
-            if any(eq_type.strip() in client_equipment for eq_type in equipment_types) or 'all' in equipment_types:
-                total_score += 15
-                match_details.append({
-                    'criterion': 'equipment_type',
-                    'result': 'Match',
-                    'reason': f"Client's equipment type ({client_equipment}) is accepted"
-                })
-            else:
-                match_details.append({
-                    'criterion': 'equipment_type',
-                    'result': 'No Match',
-                    'reason': f"Client's equipment type ({client_equipment}) is not accepted"
-                })
-
-        # Industry
-        if 'industry' in client_data and client_data['industry'] and guidelines['industries_accepted']:
-            max_possible_score += 10
-            industries = str(guidelines['industries_accepted']).lower().split(',')
-            client_industry = str(client_data['industry']).lower()
-
-            if any(ind.strip() in client_industry for ind in industries) or 'all' in industries:
-                total_score += 10
-                match_details.append({
-                    'criterion': 'industry',
-                    'result': 'Match',
-                    'reason': f"Client's industry ({client_industry}) is accepted"
-                })
-            else:
-                match_details.append({
-                    'criterion': 'industry',
-                    'result': 'No Match',
-                    'reason': f"Client's industry ({client_industry}) is not accepted"
-                })
+    def _top_matches(self, plan, bound, limit, min_score):
+        """Select the best `limit` lenders by score, then build only their details."""
+        candidates = []
+        for lender in plan.lenders:
+            if self.knockout and self._knocked_out(plan, bound, lender):
+                continue
+            score = plan.lender_score(bound, lender, self.knockout)
+            if score is not None and score > 0 and score >= min_score:
+                candidates.append((score, lender))
+
+        # nlargest is stable on ties, like the full sort it replaces
+        matches = []
+        for _, lender in heapq.nlargest(limit, candidates, key=lambda candidate: candidate[0]):
+            match_score, match_details = plan.lender_result(bound, lender, self.knockout)
+            matches.append(self._build_match(lender, match_score, match_details))
+        return matches
+
+    def _ranked_matches(self, profile, columns, scores, limit=None, min_score=0):
+        # Match details are only built for the lenders that are returned
+        plan = columns.plan
+        bound = plan.bind(profile)
+        matches = []
+        for position in rank_lenders(scores, limit, min_score):
+            lender = columns.lenders[position]
+            match_score, match_details = plan.lender_result(bound, lender, self.knockout)
+            matches.append(self._build_match(lender, match_score, match_details))
+        return matches
+
+    def _knocked_out(self, plan, bound, lender):
+        criterion = plan.lender_knockout(bound, lender)
+        if criterion is None:
+            return False
+        self.knockouts[criterion] += 1
+        return True
+
+    def _count_knockouts(self, columns, reasons):
+        rules = columns.plan.rules
+        self.knockouts.update(rules[position].criterion for position in reasons[reasons >= 0].tolist())
 
-        if max_possible_score == 0:
-            return None
+    def _profile(self, client_data):
+        if isinstance(client_data, ClientProfile):
+            return client_data
+        return ClientProfile.from_client_data(client_data)
 
-        final_score = (total_score / max_possible_score * 100)
-        return final_score, match_details
+    def _build_match(self, lender, match_score, match_details):
+        return {
+            'lender_id': lender.lender_id,
+            'lender_name': lender.name,
+            'description': lender.description,
+            'match_score': match_score,
+            'match_details': match_details
+        }
 
     def _parse_credit_score(self, credit_score):
-        try:
-            credit_str = str(credit_score).lower()
-            if '-' in credit_str:
-                parts = credit_str.split('-')
-                return int(parts[0].strip())
-            if '+' in credit_str:
-                return int(credit_str.replace('+', '').strip())
-            return int(credit_str.strip())
-        except (ValueError, AttributeError):
-            return 0
+        return parse_credit_score(credit_score)
 
     def _parse_time_in_business(self, time_in_business):
-        try:
-            time_str = str(time_in_business).lower()
-            if 'year' in time_str:
-                years = time_str.replace('years', '').replace('year', '').strip()
-                if '+' in years:
-                    years = years.replace('+', '')
-                return int(float(years)) * 12
-            if 'month' in time_str:
-                months = time_str.replace('months', '').replace('month', '').strip()
-                if '+' in months:
-                    months = months.replace('+', '')
-                return int(months)
-            return int(float(time_str))
-        except (ValueError, AttributeError):
-            return 0
+        return parse_time_in_business(time_in_business)
 
     def save_match_results(self, client_id, matches):
-        cursor = self.conn.cursor()
+        return write_match_results(self.conn, client_id, matches)
 
-        try:
-            cursor.execute("PRAGMA table_info(matches)")
-            columns = [row[1] for row in cursor.fetchall()]
-            match_details_column = 'match_details' if 'match_details' in columns else 'match_reasons'
-
-            cursor.execute('DELETE FROM matches WHERE client_id = ?', (client_id,))
-
-            for match in matches:
-                if match_details_column == 'match_details':
-                    cursor.execute(f'''
-                    INSERT INTO matches (
-                        client_id, lender_id, match_score, 
-                        match_details, created_at
-                    ) VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        client_id,
-                        match['lender_id'],
-                        match['match_score'],
-                        json.dumps(match['match_details']),
-                        datetime.now().isoformat()
-                    ))
-                else:
-                    cursor.execute(f'''
-                    INSERT INTO matches (
-                        client_id, lender_id, match_score, 
-                        match_reasons, created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (
-                        client_id,
-                        match['lender_id'],
-                        match['match_score'],
-                        json.dumps(match['match_details']),
-                        datetime.now().isoformat(),
-                        datetime.now().isoformat()
-                    ))
-
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error saving match results: {e}")
-            self.conn.rollback()
-            return False
+# Name of the matches column holding match details, cached per database file
+# so that no connection is kept alive by the cache
+_MATCH_DETAILS_COLUMNS = OrderedDict()
+_MATCH_DETAILS_COLUMNS_SIZE = 32
+
+def match_details_column(conn):
+    # The main database's file; '' for in-memory and temporary databases, which are not cached
+    db_file = next((row[2] for row in conn.execute('PRAGMA database_list').fetchall() if row[1] == 'main'), '')
+    cached = _MATCH_DETAILS_COLUMNS.get(db_file) if db_file else None
+    if cached is not None:
+        return cached
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(matches)").fetchall()]
+    column = 'match_details' if 'match_details' in columns else 'match_reasons'
+    if db_file:
+        _MATCH_DETAILS_COLUMNS[db_file] = column
+        if len(_MATCH_DETAILS_COLUMNS) > _MATCH_DETAILS_COLUMNS_SIZE:
+            _MATCH_DETAILS_COLUMNS.popitem(last=False)
+    return column
+
+def write_match_results(conn, client_id, matches):
+    """Replace a client's saved matches in one transaction."""
+    cursor = conn.cursor()
 
+    try:
+        details_column = match_details_column(conn)
+        now = datetime.now().isoformat()
+
+        cursor.execute('DELETE FROM matches WHERE client_id = ?', (client_id,))
+
+        if details_column == 'match_details':
+            cursor.executemany('''
+            INSERT INTO matches (
+                client_id, lender_id, match_score, 
+                match_details, created_at
+            ) VALUES (?, ?, ?, ?, ?)
+            ''', [
+                (client_id, match['lender_id'], match['match_score'], json.dumps(match['match_details']), now)
+                for match in matches
+            ])
+        else:
+            cursor.executemany('''
+            INSERT INTO matches (
+                client_id, lender_id, match_score, 
+                match_reasons, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (client_id, match['lender_id'], match['match_score'], json.dumps(match['match_details']), now, now)
+                for match in matches
+            ])
+
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error("Error saving match results for client %s: %s", client_id, e)
+        conn.rollback()
+        return False
+
+class DeferredMatchWriter:
+    """Saves match results on a background thread.
+
+    submit() queues a client's matches and returns immediately, so a request
+    is not held up writing match rows. The writer thread uses its own
+    connection and saves queued results in order. Results still queued when
+    the process exits are flushed by close().
+
+    The thread does not survive a fork, so a writer created before gunicorn
+    forks its workers starts a fresh queue and thread in each worker on
+    first use; results queued in the parent stay with the parent.
+    """
+
+    def __init__(self, db_path, pragmas=None):
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self.failed = 0
+        self.pid = None
+        self._lock = threading.Lock()
+        self._check_fork()
+        atexit.register(self.close)
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='match-writer', daemon=True)
+        self._thread.start()
+        # Set last, so a thread that sees this process's pid also sees its queue
+        self.pid = os.getpid()
+
+    def _check_fork(self):
+        if self.pid == os.getpid():
+            return
+        with self._lock:
+            # Only the first thread in a new process starts the writer; the rest use its queue
+            if self.pid != os.getpid():
+                self._start()
+
+    def submit(self, client_id, matches):
+        self._check_fork()
+        self._queue.put((client_id, matches))
+
+    def flush(self):
+        """Block until every submitted result has been saved."""
+        self._check_fork()
+        self._queue.join()
+
+    def close(self):
+        if self.pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        apply_pragmas(conn, self.pragmas)
+        try:
+            while True:
+                item = self._queue.get()
+                try:
+                    if item is None:
+                        return
+                    if not write_match_results(conn, *item):
+                        self.failed += 1
+                finally:
+                    self._queue.task_done()
+        finally:
+            conn.close()
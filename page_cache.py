@@ -0,0 +1,84 @@
+"""
+Rendered page cache for the BrokerBuddy application.
+
+Pages that only change with their inputs (a lender's profile, the landing
+pages) are rendered once per worker and kept, with an ETag and
+Last-Modified, in a bounded LRU cache. Callers key each page by everything
+it depends on, so a changed lender simply misses and is rendered again.
+Repeat requests carrying a matching If-None-Match or If-Modified-Since get
+a 304 without rendering anything.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response
+from werkzeug.http import is_resource_modified
+
+def make_etag(*parts):
+    """Return a short, stable ETag (unquoted) for the values a page depends on."""
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=10).hexdigest()
+
+def parse_timestamp(value):
+    """Parse a stored ISO timestamp (local time) to an aware UTC datetime, or None."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).astimezone(timezone.utc)
+    except ValueError:
+        return None
+
+class CachedPage:
+    """A rendered page body with its validators."""
+
+    __slots__ = ('body', 'etag', 'last_modified', 'mimetype')
+
+    def __init__(self, body, etag, last_modified=None, mimetype='text/html'):
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.mimetype = mimetype
+
+    def response(self, request, cache_control='no-cache', status=200):
+        """Build the response for a request, answering 304 when the client's copy is current."""
+        if status == 200 and not is_resource_modified(request.environ, etag=self.etag,
+                                                      last_modified=self.last_modified):
+            response = Response(status=304)
+        else:
+            response = Response(self.body, status=status, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        if self.last_modified is not None:
+            response.last_modified = self.last_modified
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+class PageCache:
+    """Thread-safe LRU cache of CachedPage entries, bounded to `size` pages."""
+
+    def __init__(self, size=512):
+        self.size = size
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def put(self, key, page):
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.size:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def __len__(self):
+        return len(self._pages)
@@ -0,0 +1,75 @@
+"""
+Client book re-matching script for BrokerBuddy application.
+This script re-scores every stored client against the current lender catalog
+and replaces their saved matches, e.g. nightly after lenders change guidelines.
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+from matching_engine import MatchingEngine
+from scoring_rules import load_rule_set
+
+# Get database path from environment variable or use default
+DB_PATH = os.environ.get('DATABASE_PATH', 'brokerbuddy.db')
+SCORING_RULES_PATH = os.environ.get('SCORING_RULES_PATH', '')
+# Must match the app's settings so saved match lists look the same
+MATCH_RESULT_LIMIT = int(os.environ.get('MATCH_RESULT_LIMIT', 0)) or None
+MATCH_MIN_SCORE = float(os.environ.get('MATCH_MIN_SCORE', 0))
+MATCH_KNOCKOUT = os.environ.get('MATCH_KNOCKOUT', '0') == '1'
+
+def log(message):
+    """Simple logging function"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}")
+
+def iter_clients(conn, batch_size=500):
+    """Stream client rows as client_data dicts without loading the whole table.
+
+    Rows are read in keyset-paginated batches so no read statement stays open
+    while match results are being written.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    last_id = 0
+    while True:
+        cursor.execute('SELECT * FROM clients WHERE client_id > ? ORDER BY client_id LIMIT ?', (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield dict(row)
+        last_id = rows[-1]['client_id']
+
+def rematch_clients():
+    """Re-match all clients and save their results"""
+    log(f"Re-matching clients in database at {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        engine = MatchingEngine(
+            conn,
+            vectorized=True,
+            limit=MATCH_RESULT_LIMIT,
+            min_score=MATCH_MIN_SCORE,
+            rules=load_rule_set(SCORING_RULES_PATH),
+            knockout=MATCH_KNOCKOUT
+        )
+        count = 0
+        for client_data, matches in engine.match_many(iter_clients(conn)):
+            if not engine.save_match_results(client_data['client_id'], matches):
+                log(f"Failed to save matches for client {client_data['client_id']}")
+                return False
+            count += 1
+        log(f"Re-matched {count} clients")
+        return True
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    log("Starting client re-matching")
+    if not rematch_clients():
+        log("Client re-matching failed")
+        sys.exit(1)
+    log("Client re-matching completed")
@@ -0,0 +1,323 @@
+"""
+Incremental lender re-matching script for BrokerBuddy application.
+When lenders change their guidelines, this script re-scores only those lenders
+against the stored clients and updates, inserts or deletes the affected
+matches rows, instead of re-matching every client against every lender.
+
+Changed lenders are found with an updated_at watermark over the lenders and
+lender_guidelines tables, kept in the rematch_watermarks table. Writers that
+edit guideline rows must bump updated_at for the change to be picked up.
+Deleted lender and guideline rows leave no updated_at behind, so triggers
+record them in the rematch_deletions table; the triggers exist from the
+first run of this script, and deletes made before that need a full
+rematch_clients.py run. Runs limited with --lender-id leave the watermark
+alone, so other changes are still picked up by the next incremental run.
+
+Usage:
+    python rematch_lenders.py                  # lenders changed since the last run
+    python rematch_lenders.py --lender-id 3    # specific lenders
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+from lender_catalog import LenderCatalog
+from matching_engine import MatchingEngine, match_details_column, write_match_results
+from rematch_clients import MATCH_KNOCKOUT, MATCH_MIN_SCORE, MATCH_RESULT_LIMIT, iter_clients, log
+from scoring_rules import load_rule_set
+
+# Get database path from environment variable or use default
+DB_PATH = os.environ.get('DATABASE_PATH', 'brokerbuddy.db')
+SCORING_RULES_PATH = os.environ.get('SCORING_RULES_PATH', '')
+
+WATERMARK_NAME = 'lender_guidelines'
+
+def ensure_rematch_tables(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS rematch_watermarks (
+        name TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    ''')
+    # Tombstones for deleted lender and guideline rows, written by the triggers below
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS rematch_deletions (
+        lender_id INTEGER NOT NULL,
+        deleted_at TEXT NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_rematch_deletions_deleted_at ON rematch_deletions (deleted_at)')
+    for table in ('lenders', 'lender_guidelines'):
+        # Same format as the datetime.now().isoformat() updated_at values
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS rematch_{table}_deleted AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO rematch_deletions (lender_id, deleted_at)
+            VALUES (OLD.lender_id, strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'));
+        END
+        ''')
+    # Matches are updated and deleted by (client_id, lender_id)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_matches_client_lender ON matches (client_id, lender_id)')
+    conn.commit()
+
+def read_watermark(conn):
+    row = conn.execute('SELECT value FROM rematch_watermarks WHERE name = ?', (WATERMARK_NAME,)).fetchone()
+    return row[0] if row else None
+
+def write_watermark(conn, value):
+    conn.execute('''
+    INSERT INTO rematch_watermarks (name, value) VALUES (?, ?)
+    ON CONFLICT(name) DO UPDATE SET value = excluded.value
+    ''', (WATERMARK_NAME, value))
+    conn.commit()
+
+def current_watermark(conn):
+    """Latest updated_at or deletion across the lenders and lender_guidelines tables."""
+    row = conn.execute('''
+    SELECT MAX(value) FROM (
+        SELECT MAX(updated_at) AS value FROM lenders
+        UNION ALL
+        SELECT MAX(updated_at) FROM lender_guidelines
+        UNION ALL
+        SELECT MAX(deleted_at) FROM rematch_deletions
+    )
+    ''').fetchone()
+    return row[0]
+
+def changed_lender_ids(conn, since):
+    """IDs of lenders whose lender or guideline rows were updated or deleted after `since`."""
+    cursor = conn.execute('''
+    SELECT lender_id FROM lenders WHERE updated_at > ?
+    UNION
+    SELECT lender_id FROM lender_guidelines WHERE updated_at > ?
+    UNION
+    SELECT lender_id FROM rematch_deletions WHERE deleted_at > ?
+    ''', (since, since, since))
+    return sorted(row[0] for row in cursor.fetchall())
+
+def prune_deletions(conn, watermark):
+    """Drop tombstones already covered by the watermark."""
+    conn.execute('DELETE FROM rematch_deletions WHERE deleted_at <= ?', (watermark,))
+    conn.commit()
+
+class LenderRematcher:
+    """Re-scores a set of lenders against every stored client.
+
+    Each client's saved matches are its best `limit` lenders, so a changed
+    lender is upserted or deleted in place, and the list is trimmed back to
+    `limit` when a lender enters it. When a full list loses a lender or sees
+    its score drop, a lender outside the list may now belong in it, so that
+    client is re-matched in full instead.
+    """
+
+    def __init__(self, conn, engine, limit=None, min_score=0, batch_size=500):
+        self.conn = conn
+        self.engine = engine
+        self.limit = limit
+        self.min_score = min_score
+        self.batch_size = batch_size
+        self.details_column = match_details_column(conn)
+        self.stats = {'clients': 0, 'updated': 0, 'inserted': 0, 'deleted': 0, 'trimmed': 0, 'full_rematches': 0}
+
+    def rematch(self, lender_ids):
+        lender_ids = set(lender_ids)
+        lenders = [lender for lender in self.engine._get_lenders() if lender.lender_id in lender_ids]
+        # Lenders without guideline rows are not in the catalog and match nobody
+        removed_ids = lender_ids - {lender.lender_id for lender in lenders}
+        plan = self.engine.rules.compile(lenders)
+
+        batch = []
+        for client_data in iter_clients(self.conn, self.batch_size):
+            batch.append(client_data)
+            if len(batch) >= self.batch_size:
+                self._rematch_batch(batch, plan, removed_ids)
+                batch = []
+        if batch:
+            self._rematch_batch(batch, plan, removed_ids)
+        return self.stats
+
+    def _score(self, plan, bound, lender):
+        if self.engine.knockout and plan.lender_knockout(bound, lender) is not None:
+            return None
+        result = plan.lender_result(bound, lender, self.engine.knockout)
+        if result and result[0] > 0 and result[0] >= self.min_score:
+            return result
+        return None
+
+    def _saved_matches(self, client_ids, lender_ids):
+        """Saved scores for the batch by (client_id, lender_id), and each full list's last entry.
+
+        The last entry is the (score, lender_id) ranked lowest in a client's
+        saved list; a lender ranking below it would not make the list.
+        """
+        low, high = client_ids[0], client_ids[-1]
+        placeholders = ','.join('?' * len(lender_ids))
+        cursor = self.conn.execute(f'''
+        SELECT client_id, lender_id, match_score FROM matches
+        WHERE client_id BETWEEN ? AND ? AND lender_id IN ({placeholders})
+        ''', (low, high, *lender_ids))
+        saved = {(client_id, lender_id): score for client_id, lender_id, score in cursor.fetchall()}
+
+        cutoffs = {}
+        if self.limit is not None:
+            ranked = {}
+            cursor = self.conn.execute('''
+            SELECT client_id, lender_id, match_score FROM matches WHERE client_id BETWEEN ? AND ?
+            ''', (low, high))
+            for client_id, lender_id, score in cursor.fetchall():
+                ranked.setdefault(client_id, []).append((-score, lender_id))
+            for client_id, entries in ranked.items():
+                if len(entries) >= self.limit:
+                    cutoffs[client_id] = max(entries)
+        return saved, cutoffs
+
+    def _rematch_batch(self, batch, plan, removed_ids):
+        client_ids = [client_data['client_id'] for client_data in batch]
+        lender_ids = [lender.lender_id for lender in plan.lenders] + sorted(removed_ids)
+        saved, cutoffs = self._saved_matches(client_ids, lender_ids)
+        now = datetime.now().isoformat()
+
+        updates, inserts, deletes = [], [], []
+        grown, full_rematch = set(), []
+        for client_data in batch:
+            client_id = client_data['client_id']
+            cutoff = cutoffs.get(client_id)
+            needs_full = False
+            bound = plan.bind(self.engine._profile(client_data))
+            for lender in plan.lenders:
+                result = self._score(plan, bound, lender)
+                saved_score = saved.get((client_id, lender.lender_id))
+                if result is None:
+                    if saved_score is not None:
+                        deletes.append((client_id, lender.lender_id))
+                        needs_full = needs_full or cutoff is not None
+                    continue
+                match_score, match_details = result
+                if saved_score is None:
+                    if cutoff is None or (-match_score, lender.lender_id) < cutoff:
+                        inserts.append((client_id, lender.lender_id, match_score, json.dumps(match_details), now))
+                        grown.add(client_id)
+                else:
+                    updates.append((match_score, json.dumps(match_details), client_id, lender.lender_id))
+                    needs_full = needs_full or (cutoff is not None and match_score < saved_score)
+            for lender_id in removed_ids:
+                if (client_id, lender_id) in saved:
+                    deletes.append((client_id, lender_id))
+                    needs_full = needs_full or cutoff is not None
+            if needs_full:
+                full_rematch.append(client_data)
+
+        # Clients re-matched in full are rewritten below, so skip their row changes
+        skip = {client_data['client_id'] for client_data in full_rematch}
+        updates = [row for row in updates if row[2] not in skip]
+        inserts = [row for row in inserts if row[0] not in skip]
+        deletes = [row for row in deletes if row[0] not in skip]
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(f'''
+            UPDATE matches SET match_score = ?, {self.details_column} = ?
+            WHERE client_id = ? AND lender_id = ?
+            ''', updates)
+            if self.details_column == 'match_details':
+                cursor.executemany('''
+                INSERT INTO matches (client_id, lender_id, match_score, match_details, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ''', inserts)
+            else:
+                cursor.executemany('''
+                INSERT INTO matches (client_id, lender_id, match_score, match_reasons, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', [row + (now,) for row in inserts])
+            cursor.executemany('DELETE FROM matches WHERE client_id = ? AND lender_id = ?', deletes)
+            trimmed = 0
+            if self.limit is not None:
+                for client_id in sorted(grown - skip):
+                    # Keep the best `limit` rows; ties rank in catalog (lender_id) order
+                    cursor.execute('''
+                    DELETE FROM matches WHERE rowid IN (
+                        SELECT rowid FROM matches WHERE client_id = ?
+                        ORDER BY match_score DESC, lender_id
+                        LIMIT -1 OFFSET ?
+                    )
+                    ''', (client_id, self.limit))
+                    trimmed += cursor.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        for client_data in full_rematch:
+            matches = self.engine.find_matching_lenders(client_data)
+            if not write_match_results(self.conn, client_data['client_id'], matches):
+                raise RuntimeError(f"Failed to save matches for client {client_data['client_id']}")
+
+        self.stats['clients'] += len(batch)
+        self.stats['updated'] += len(updates)
+        self.stats['inserted'] += len(inserts)
+        self.stats['deleted'] += len(deletes)
+        self.stats['trimmed'] += trimmed
+        self.stats['full_rematches'] += len(full_rematch)
+
+def rematch_lenders(lender_ids=None):
+    """Re-match the given lenders, or those changed since the last run"""
+    log(f"Re-matching lenders in database at {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH)
+    catalog = LenderCatalog(DB_PATH)
+    try:
+        ensure_rematch_tables(conn)
+        watermark = current_watermark(conn)
+        # Only a run over every changed lender may move the watermark
+        incremental = lender_ids is None
+        if incremental:
+            since = read_watermark(conn)
+            if since is None:
+                # Nothing to compare against yet; run rematch_clients.py for a full refresh
+                log(f"No watermark recorded; starting from {watermark}")
+                if watermark is not None:
+                    write_watermark(conn, watermark)
+                    prune_deletions(conn, watermark)
+                return True
+            lender_ids = changed_lender_ids(conn, since)
+            log(f"{len(lender_ids)} lenders changed since {since}")
+
+        if lender_ids:
+            engine = MatchingEngine(
+                conn,
+                catalog=catalog,
+                vectorized=True,
+                limit=MATCH_RESULT_LIMIT,
+                min_score=MATCH_MIN_SCORE,
+                rules=load_rule_set(SCORING_RULES_PATH),
+                knockout=MATCH_KNOCKOUT
+            )
+            rematcher = LenderRematcher(conn, engine, limit=MATCH_RESULT_LIMIT, min_score=MATCH_MIN_SCORE)
+            stats = rematcher.rematch(lender_ids)
+            log(f"Re-matched lenders {lender_ids}: {stats}")
+
+        if incremental and watermark is not None:
+            write_watermark(conn, watermark)
+            prune_deletions(conn, watermark)
+        return True
+    except Exception as e:
+        log(f"Error re-matching lenders: {e}")
+        return False
+    finally:
+        catalog.close()
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-match changed lenders against stored clients")
+    parser.add_argument('--lender-id', type=int, action='append', dest='lender_ids',
+                        help="Lender to re-match (repeatable); default is lenders changed since the last run")
+    args = parser.parse_args()
+
+    log("Starting lender re-matching")
+    if not rematch_lenders(args.lender_ids):
+        log("Lender re-matching failed")
+        sys.exit(1)
+    log("Lender re-matching completed")
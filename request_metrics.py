@@ -0,0 +1,211 @@
+"""
+Request instrumentation for the BrokerBuddy application.
+
+Each instrumented request gets a RequestMetrics that collects timing spans
+around its stages (database insert, catalog load, scoring, ...), counters
+such as lenders scanned, and the number of SQL statements it ran. When the
+request ends these are folded into a per-worker MetricsRegistry, which
+renders them in the Prometheus text format for /metrics, and can be sent
+back as a Server-Timing header.
+
+With instrumentation disabled, routes get NULL_METRICS, whose spans and
+counters do nothing, so the hot path only pays for a no-op context manager.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+
+METRIC_PREFIX = 'brokerbuddy_'
+
+# Histogram buckets for durations in seconds, and for per-request query counts
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+_HELP = {
+    'requests': "Requests handled, by endpoint, method and status.",
+    'request_duration_seconds': "Request duration, by endpoint and method.",
+    'stage_duration_seconds': "Time spent in each instrumented request stage, by endpoint.",
+    'request_queries': "SQL statements run per request, by endpoint.",
+    'lenders_scanned': "Lenders scored by the matching engine.",
+    'lenders_knocked_out': "Lenders dropped by a knockout criterion, by criterion.",
+    'match_job_duration_seconds': "Time to score and save a background match job.",
+}
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.spans.append((self.name, time.perf_counter() - self.start))
+        return False
+
+class RequestMetrics:
+    """Timing spans, counters and a query count for one request."""
+
+    __slots__ = ('started', 'spans', 'counters', 'queries')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.queries = 0
+
+    def span(self, name):
+        """Context manager timing one stage of the request."""
+        return _Span(self, name)
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Format the spans, query count and total time as a Server-Timing header value."""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.spans]
+        parts.append(f'db;desc="{self.queries} queries"')
+        parts.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ', '.join(parts)
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+class _NullMetrics:
+    """Stand-in for RequestMetrics when instrumentation is disabled."""
+
+    __slots__ = ()
+    _span = _NullSpan()
+
+    def span(self, name):
+        return self._span
+
+    def count(self, name, value=1, **labels):
+        pass
+
+NULL_METRICS = _NullMetrics()
+
+# The instrumented request running in this context, for the SQL trace callback
+_current = ContextVar('request_metrics', default=None)
+
+def activate(metrics):
+    """Make `metrics` the current request's; returns a token for deactivate."""
+    return _current.set(metrics)
+
+def deactivate(token):
+    _current.reset(token)
+
+def count_query(statement):
+    """sqlite3 trace callback counting statements against the current request."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.queries += 1
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+class MetricsRegistry:
+    """Per-worker counters and histograms, rendered in the Prometheus text format.
+
+    Like the lender catalog and result store, each worker process keeps its
+    own registry, so a scrape shows the worker that served it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, labels=()):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=(), buckets=DURATION_BUCKETS):
+        key = (name, tuple(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def record_request(self, endpoint, method, status, metrics):
+        """Fold a finished request's RequestMetrics into the registry."""
+        labels = (('endpoint', endpoint), ('method', method))
+        self.inc('requests', labels=labels + (('status', status),))
+        self.observe('request_duration_seconds', metrics.elapsed(), labels)
+        for name, seconds in metrics.spans:
+            self.observe('stage_duration_seconds', seconds, (('endpoint', endpoint), ('stage', name)))
+        self.observe('request_queries', metrics.queries, (('endpoint', endpoint),), QUERY_BUCKETS)
+        for (name, counter_labels), value in metrics.counters.items():
+            self.inc(name, value, counter_labels)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, (list(h.counts), h.sum, h.count, h.buckets)) for key, h in histograms]
+
+        lines = []
+        described = set()
+
+        def describe(name, kind, suffix=''):
+            if name not in described:
+                described.add(name)
+                if name in _HELP:
+                    lines.append(f"# HELP {METRIC_PREFIX}{name}{suffix} {_HELP[name]}")
+                lines.append(f"# TYPE {METRIC_PREFIX}{name}{suffix} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, 'counter', '_total')
+            lines.append(f"{METRIC_PREFIX}{name}_total{_format_labels(labels)} {value}")
+
+        for (name, labels), (counts, total, count, buckets) in histograms:
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(labels)} {count}")
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,92 @@
+"""
+Server-side store for client match results.
+
+Results are kept in a bounded in-process cache keyed by client_id, backed by
+the clients and matches tables, so the session cookie only needs to carry
+the client_id.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from match_reasons import load_match_details
+from matching_engine import match_details_column
+
+CLIENT_FIELDS = (
+    'business_name', 'industry', 'time_in_business', 'monthly_revenue', 'credit_score',
+    'equipment_type', 'equipment_cost', 'notes', 'interested_in_wc'
+)
+
+class MatchResultStore:
+    """Per-worker cache of (client_data, matches) with a database fallback.
+
+    Entries expire after `ttl` seconds and the least recently used are
+    evicted beyond `size`. A miss (another worker's client, an expired entry
+    or a restart) is rebuilt from the clients and matches tables, so results
+    written in deferred mode may not be visible there until saved.
+    """
+
+    def __init__(self, size=1000, ttl=3600):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, client_id, client_data, matches):
+        with self._lock:
+            self._entries[client_id] = (time.monotonic() + self.ttl, client_data, matches)
+            self._entries.move_to_end(client_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, client_id, conn=None):
+        """Return (client_data, matches) for a client, or None if unknown."""
+        with self._lock:
+            entry = self._entries.get(client_id)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(client_id)
+                    return entry[1], entry[2]
+                del self._entries[client_id]
+
+        if conn is None:
+            return None
+        result = load_match_results(conn, client_id)
+        if result is not None:
+            self.put(client_id, *result)
+        return result
+
+    def discard(self, client_id):
+        with self._lock:
+            self._entries.pop(client_id, None)
+
+def load_match_results(conn, client_id):
+    """Rebuild (client_data, matches) for a client from the database."""
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute('SELECT * FROM clients WHERE client_id = ?', (client_id,))
+    client = cursor.fetchone()
+    if client is None:
+        return None
+    client_data = {field: client[field] if field in client.keys() else '' for field in CLIENT_FIELDS}
+
+    details_column = match_details_column(conn)
+    # Same order as find_matching_lenders: score, then catalog order on ties.
+    # rematch_lenders.py updates rows in place, so rowid order is not rank order.
+    cursor.execute(f'''
+    SELECT m.lender_id, m.match_score, m.{details_column} AS match_details, l.name, l.description
+    FROM matches m JOIN lenders l ON l.lender_id = m.lender_id
+    WHERE m.client_id = ?
+    ORDER BY m.match_score DESC, l.rowid
+    ''', (client_id,))
+    matches = [{
+        'lender_id': row['lender_id'],
+        'lender_name': row['name'],
+        'description': row['description'],
+        'match_score': row['match_score'],
+        'match_details': load_match_details(json.loads(row['match_details'])) if row['match_details'] else []
+    } for row in cursor.fetchall()]
+    return client_data, matches
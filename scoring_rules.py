@@ -0,0 +1,372 @@
+"""
+Declarative scoring rules for the BrokerBuddy matching engine.
+
+A rule set is a list of criteria. Each rule names the client field it reads,
+the guideline (or lender) field that holds the lender's requirement, a
+comparison operator and a weight. A criterion only counts towards a lender's
+score when the client provided the value and the guideline sets the
+requirement; the score is the weight earned over the weight that applied.
+
+Rule sets are plain data, so they can be kept in a JSON file (see
+``load_rule_set``) instead of code. A rule can be limited to some lender
+programs with ``programs``; for example, to score working capital programs
+on monthly revenue:
+
+    {"criterion": "monthly_revenue", "operator": "at_least",
+     "client_field": "monthly_revenue", "guideline_field": "min_monthly_revenue",
+     "weight": 15, "programs": ["Working Capital"]}
+
+Operators:
+    at_least      client value >= the guideline's number
+    between       guideline min <= client value <= guideline max
+                  (``guideline_field`` is a [min_field, max_field] pair)
+    accepts_term  any comma-separated guideline term occurs in the client
+                  value, or the guideline accepts "all"
+    one_of        the guideline or lender field is one of ``values``; used
+                  for yes/no client fields such as interested_in_wc
+
+A rule marked ``"knockout": true`` is a hard requirement when the engine
+runs in knockout mode: a guideline row failing it is dropped before its other
+criteria are evaluated, and a lender with no rows left is knocked out.
+Knockout checks run cheapest first (fixed outcomes, then numeric floors,
+ranges and term lookups).
+
+A rule set is compiled once per lender catalog into a ScoringPlan, which
+pre-parses every guideline's requirements and keeps, per guideline, only the
+checks that apply to it.
+"""
+
+import json
+
+from client_profile import ClientProfile, safe_convert_to_number
+from lender_index import TermIndex
+from match_reasons import MatchDetail
+
+OPERATORS = ('at_least', 'between', 'accepts_term', 'one_of')
+
+# Relative cost of evaluating each operator, used to order knockout checks
+OPERATOR_COST = {'one_of': 0, 'at_least': 1, 'between': 2, 'accepts_term': 3}
+
+# The engine's standard criteria. working_capital has no weight: it marks
+# lenders offering working capital to interested clients, which the results
+# page uses to group matches, without changing equipment scores. Rules without
+# weight only add a match detail when they pass.
+# Lenders do not fund below their credit score or time in business floors,
+# so those are knockouts.
+DEFAULT_RULES = (
+    {'criterion': 'credit_score', 'operator': 'at_least', 'client_field': 'credit_score',
+     'guideline_field': 'min_credit_score', 'weight': 25, 'knockout': True},
+    {'criterion': 'time_in_business', 'operator': 'at_least', 'client_field': 'time_in_business',
+     'guideline_field': 'min_time_in_business', 'weight': 25, 'knockout': True},
+    {'criterion': 'loan_amount', 'operator': 'between', 'client_field': 'equipment_cost',
+     'guideline_field': ['min_equipment_cost', 'max_equipment_cost'], 'weight': 25},
+    {'criterion': 'equipment_type', 'operator': 'accepts_term', 'client_field': 'equipment_type',
+     'guideline_field': 'equipment_types', 'weight': 15},
+    {'criterion': 'industry', 'operator': 'accepts_term', 'client_field': 'industry',
+     'guideline_field': 'industries_accepted', 'weight': 10},
+    {'criterion': 'working_capital', 'operator': 'one_of', 'client_field': 'interested_in_wc',
+     'lender_field': 'program_type', 'values': ['Working Capital'], 'weight': 0},
+)
+
+def compile_terms(value):
+    """Split a comma-separated guideline field into (terms, accepts_all).
+
+    Mirrors the matching rule ``any(term.strip() in client_value) or 'all' in
+    terms``: an empty term is a substring of every value, so it accepts all.
+    """
+    raw_terms = str(value).lower().split(',')
+    terms = tuple(dict.fromkeys(term.strip() for term in raw_terms))
+    accepts_all = 'all' in raw_terms or '' in terms
+    return frozenset(terms), accepts_all
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+class ScoringRule:
+    """One declared criterion, validated."""
+
+    __slots__ = ('criterion', 'operator', 'client_field', 'guideline_field', 'lender_field',
+                 'values', 'weight', 'programs', 'knockout')
+
+    def __init__(self, spec):
+        self.criterion = spec.get('criterion')
+        self.operator = spec.get('operator')
+        self.client_field = spec.get('client_field')
+        self.guideline_field = spec.get('guideline_field')
+        self.lender_field = spec.get('lender_field')
+        self.weight = spec.get('weight', 0)
+        self.knockout = spec.get('knockout', False)
+        values = spec.get('values')
+        programs = spec.get('programs')
+        self.values = frozenset(_normalize(value) for value in values) if values is not None else None
+        self.programs = frozenset(_normalize(program) for program in programs) if programs is not None else None
+
+        if not self.criterion:
+            raise ValueError(f"Scoring rule has no criterion: {spec}")
+        if self.operator not in OPERATORS:
+            raise ValueError(f"Invalid operator for scoring rule {self.criterion}: {self.operator}")
+        if self.client_field not in ClientProfile.__slots__:
+            raise ValueError(f"Invalid client field for scoring rule {self.criterion}: {self.client_field}")
+        if (self.guideline_field is None) == (self.lender_field is None):
+            raise ValueError(f"Scoring rule {self.criterion} needs exactly one of guideline_field or lender_field")
+        if self.operator == 'between':
+            fields = self.guideline_field if self.lender_field is None else self.lender_field
+            if not isinstance(fields, (list, tuple)) or len(fields) != 2:
+                raise ValueError(f"Scoring rule {self.criterion} needs a [min, max] field pair")
+        if self.operator == 'one_of' and self.values is None:
+            raise ValueError(f"Scoring rule {self.criterion} needs values")
+        if not isinstance(self.weight, (int, float)) or self.weight < 0:
+            raise ValueError(f"Invalid weight for scoring rule {self.criterion}: {self.weight}")
+        if not isinstance(self.knockout, bool):
+            raise ValueError(f"Invalid knockout flag for scoring rule {self.criterion}: {self.knockout}")
+
+    def __repr__(self):
+        return f"ScoringRule({self.criterion!r}, {self.operator!r}, weight={self.weight!r})"
+
+    def threshold(self, lender, guideline):
+        """Compile this rule's requirement for a guideline row.
+
+        Returns None when the row does not set the requirement (or the
+        lender's program is not covered by the rule).
+        """
+        if self.programs is not None and _normalize(lender.row.get('program_type') or '') not in self.programs:
+            return None
+        row = guideline.row if self.lender_field is None else lender.row
+        field = self.guideline_field if self.lender_field is None else self.lender_field
+
+        if self.operator == 'between':
+            minimum, maximum = row.get(field[0]), row.get(field[1])
+            if minimum and maximum:
+                return safe_convert_to_number(minimum), safe_convert_to_number(maximum)
+            return None
+
+        value = row.get(field)
+        if not value:
+            return None
+        if self.operator == 'at_least':
+            return safe_convert_to_number(value)
+        if self.operator == 'accepts_term':
+            return compile_terms(value)
+        return _normalize(value)
+
+class RuleSet:
+    """An ordered collection of ScoringRules.
+
+    Rules are evaluated, and match details listed, in declaration order.
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rule if isinstance(rule, ScoringRule) else ScoringRule(rule) for rule in rules)
+        criteria = [rule.criterion for rule in self.rules]
+        if len(set(criteria)) != len(criteria):
+            raise ValueError("Scoring rule criteria must be unique")
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a rule set from a JSON file holding a list of rules or {"rules": [...]}."""
+        with open(path) as f:
+            specs = json.load(f)
+        if isinstance(specs, dict):
+            specs = specs.get('rules', [])
+        return cls(specs)
+
+    def compile(self, lenders):
+        return ScoringPlan(self, lenders)
+
+DEFAULT_RULE_SET = RuleSet(DEFAULT_RULES)
+
+def load_rule_set(path=None):
+    """Return the rule set stored at `path`, or the default rules without one."""
+    if not path:
+        return DEFAULT_RULE_SET
+    return RuleSet.from_file(path)
+
+# Check kinds in a compiled ScoringPlan
+_AT_LEAST, _BETWEEN, _TERMS, _FIXED = range(4)
+
+class ScoringPlan:
+    """A rule set compiled against a lender catalog.
+
+    Every guideline's requirements are parsed once, and each guideline keeps
+    a tuple of checks for only the rules it sets. A check is (rule position,
+    kind, weight, operand): a numeric threshold, a (min, max) pair, or for
+    one_of rules the already decided outcome. Knockout rules also get a
+    separate, cheapest-first tuple of checks. Scoring a client binds its
+    values once per request (see ``bind``) and then runs each guideline's
+    checks without re-parsing anything.
+    """
+
+    def __init__(self, rule_set, lenders):
+        self.rule_set = rule_set
+        self.rules = rule_set.rules
+        self.lenders = lenders
+        self.guidelines = [g for lender in lenders for g in lender.guidelines]
+
+        # thresholds[rule position][guideline row]
+        self.thresholds = [
+            [rule.threshold(lender, g) for lender in lenders for g in lender.guidelines]
+            for rule in self.rules
+        ]
+        kinds = {'at_least': _AT_LEAST, 'between': _BETWEEN, 'accepts_term': _TERMS, 'one_of': _FIXED}
+        self.checks = {}
+        self.checks_by_kind = {}
+        self.knockout_checks = {}
+        for row, guideline in enumerate(self.guidelines):
+            checks = []
+            for position, rule in enumerate(self.rules):
+                threshold = self.thresholds[position][row]
+                if threshold is None:
+                    continue
+                if rule.operator == 'one_of':
+                    threshold = threshold in rule.values
+                checks.append((position, kinds[rule.operator], rule.weight, threshold))
+            self.checks[guideline] = tuple(checks)
+            self.knockout_checks[guideline] = tuple(sorted(
+                (check for check in checks if self.rules[check[0]].knockout),
+                key=lambda check: OPERATOR_COST[self.rules[check[0]].operator]
+            ))
+            # The same checks split by kind, for the score-only loop in lender_score
+            self.checks_by_kind[guideline] = (
+                tuple((position, weight, threshold) for position, kind, weight, threshold in checks if kind == _AT_LEAST),
+                tuple((position, weight, threshold) for position, kind, weight, threshold in checks if kind == _BETWEEN),
+                tuple((position, weight) for position, kind, weight, threshold in checks if kind == _TERMS),
+                tuple((position, weight, threshold) for position, kind, weight, threshold in checks if kind == _FIXED)
+            )
+        self.term_indexes = {
+            position: TermIndex(zip(self.guidelines, self.thresholds[position]))
+            for position, rule in enumerate(self.rules)
+            if rule.operator == 'accepts_term'
+        }
+
+    def bind(self, profile):
+        """Return (values, operands) lists for a ClientProfile, indexed by rule.
+
+        ``values`` holds the client's value per rule. The operand is what the
+        checks compare against: the value itself, or for accepts_term rules
+        the set of guidelines accepting it. It is None when the client did
+        not provide the value, so the rule does not apply.
+        """
+        values = [getattr(profile, rule.client_field) for rule in self.rules]
+        operands = list(values)
+        for position, index in self.term_indexes.items():
+            if values[position] is not None:
+                operands[position] = index.matching(values[position])
+        return values, operands
+
+    def _passes(self, guideline, kind, threshold, operand):
+        if kind == _AT_LEAST:
+            return operand >= threshold
+        if kind == _BETWEEN:
+            return threshold[0] <= operand <= threshold[1]
+        if kind == _TERMS:
+            return guideline in operand
+        return threshold
+
+    def evaluate(self, bound, guideline):
+        """Return (score, match details) for one guideline, or None if no criterion applies."""
+        values, operands = bound
+        match_details = []
+        total_score = 0
+        max_possible_score = 0
+        for position, kind, weight, threshold in self.checks[guideline]:
+            operand = operands[position]
+            if operand is None:
+                continue
+            max_possible_score += weight
+            matched = self._passes(guideline, kind, threshold, operand)
+            if matched:
+                total_score += weight
+            elif not weight:
+                # A failed rule without weight only says the lender lacks something extra
+                continue
+            shown_threshold = threshold if kind in (_AT_LEAST, _BETWEEN) else None
+            match_details.append(MatchDetail(self.rules[position].criterion, matched, values[position], shown_threshold))
+        if not max_possible_score:
+            return None
+        return total_score / max_possible_score * 100, match_details
+
+    def knocked_out(self, bound, guideline):
+        """Return the first knockout criterion a guideline row fails, or None."""
+        operands = bound[1]
+        for position, kind, weight, threshold in self.knockout_checks[guideline]:
+            operand = operands[position]
+            if operand is not None and not self._passes(guideline, kind, threshold, operand):
+                return self.rules[position].criterion
+        return None
+
+    def lender_knockout(self, bound, lender):
+        """Return the criterion knocking out a lender, or None if any row survives.
+
+        A lender whose rows are all knocked out is attributed to the
+        criterion that knocked out its first row.
+        """
+        criterion = None
+        for guideline in lender.guidelines:
+            failed = self.knocked_out(bound, guideline)
+            if failed is None:
+                return None
+            if criterion is None:
+                criterion = failed
+        return criterion
+
+    def lender_score(self, bound, lender, knockout=False):
+        """Best score over a lender's guideline rows, without match details.
+
+        Returns None when no criterion applies to any row. With ``knockout``,
+        rows failing a knockout rule are skipped.
+        """
+        operands = bound[1]
+        checks_by_kind = self.checks_by_kind
+        best = None
+        # The checks are inlined here as this runs for every lender in the scalar path
+        for guideline in lender.guidelines:
+            if knockout and self.knocked_out(bound, guideline) is not None:
+                continue
+            total_score = 0
+            max_possible_score = 0
+            at_least, between, terms, fixed = checks_by_kind[guideline]
+            for position, weight, threshold in at_least:
+                operand = operands[position]
+                if operand is not None:
+                    max_possible_score += weight
+                    if operand >= threshold:
+                        total_score += weight
+            for position, weight, threshold in between:
+                operand = operands[position]
+                if operand is not None:
+                    max_possible_score += weight
+                    if threshold[0] <= operand <= threshold[1]:
+                        total_score += weight
+            for position, weight in terms:
+                operand = operands[position]
+                if operand is not None:
+                    max_possible_score += weight
+                    if guideline in operand:
+                        total_score += weight
+            for position, weight, passed in fixed:
+                if operands[position] is not None:
+                    max_possible_score += weight
+                    if passed:
+                        total_score += weight
+            if max_possible_score:
+                score = total_score / max_possible_score * 100
+                if best is None or score > best:
+                    best = score
+        return best
+
+    def lender_result(self, bound, lender, knockout=False):
+        """Best (score, match details) over a lender's guideline rows.
+
+        A lender program may have several guideline rows; the lender is
+        listed once, using whichever row gives the client the best score
+        (the first such row on a tie). With ``knockout``, rows failing a
+        knockout rule are skipped.
+        """
+        result = None
+        for guideline in lender.guidelines:
+            if knockout and self.knocked_out(bound, guideline) is not None:
+                continue
+            candidate = self.evaluate(bound, guideline)
+            if candidate and (result is None or candidate[0] > result[0]):
+                result = candidate
+        return result
@@ -58,6 +58,7 @@ def create_schema(conn):
         equipment_cost TEXT NOT NULL,
         industry TEXT,
         notes TEXT,
+        interested_in_wc TEXT,
         created_at TEXT,
         updated_at TEXT
     )
@@ -0,0 +1,36 @@
+"""Tests for the bulk lender importer."""
+
+import sqlite3
+
+import simple_reset_db
+from lender_catalog import load_compiled_lenders
+from lender_import import LenderImporter, iter_old_db_records
+from matching_engine import MatchingEngine
+
+def make_old_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+    CREATE TABLE lenders (id INTEGER PRIMARY KEY, name TEXT, program_type TEXT);
+    CREATE TABLE criteria_categories (id INTEGER PRIMARY KEY, name TEXT);
+    CREATE TABLE lender_criteria (lender_id INTEGER, category_id INTEGER, value TEXT);
+    INSERT INTO lenders VALUES (1, 'Criteria Lender', 'App Only'), (2, 'Bare Lender', 'App Only');
+    INSERT INTO criteria_categories VALUES (1, 'personal_credit');
+    INSERT INTO lender_criteria VALUES (1, 1, '650+');
+    ''')
+    conn.commit()
+    conn.close()
+
+def test_old_lender_without_criteria_is_still_matchable(tmp_path):
+    old_db = tmp_path / 'old.db'
+    make_old_db(str(old_db))
+    conn = sqlite3.connect(':memory:')
+    simple_reset_db.create_schema(conn)
+
+    LenderImporter(conn, progress=None).run(iter_old_db_records(str(old_db)))
+
+    lenders = {lender.name: lender for lender in load_compiled_lenders(conn)}
+    assert set(lenders) == {'Criteria Lender', 'Bare Lender'}
+    assert len(lenders['Bare Lender'].guidelines) == 1
+
+    matches = MatchingEngine(conn).find_matching_lenders({'credit_score': '700', 'time_in_business': '24'})
+    assert 'Bare Lender' in [match['lender_name'] for match in matches]
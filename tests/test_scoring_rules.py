@@ -0,0 +1,46 @@
+"""Tests for the declarative scoring rules."""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import simple_reset_db
+from matching_engine import MatchingEngine
+
+CLIENT = {
+    'credit_score': '700',
+    'time_in_business': '36',
+    'equipment_type': 'Construction',
+    'equipment_cost': '50000',
+    'industry': 'construction',
+    'interested_in_wc': 'yes',
+}
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    simple_reset_db.create_schema(conn)
+    now = datetime.now().isoformat()
+    for lender_id, name, program_type in ((1, 'Equipment Lender', 'App Only'),
+                                          (2, 'Working Capital Lender', 'Working Capital')):
+        conn.execute('INSERT INTO lenders (lender_id, name, program_type, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                     (lender_id, name, program_type, now, now))
+        conn.execute('''
+        INSERT INTO lender_guidelines (lender_id, min_credit_score, min_time_in_business, min_equipment_cost,
+                                       max_equipment_cost, equipment_types, industries_accepted, created_at, updated_at)
+        VALUES (?, '650', '24', '10000', '250000', 'Construction', 'all', ?, ?)
+        ''', (lender_id, now, now))
+    conn.commit()
+    yield conn
+    conn.close()
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_working_capital_detail_only_for_working_capital_lenders(conn, vectorized):
+    matches = MatchingEngine(conn, vectorized=vectorized).find_matching_lenders(CLIENT)
+    criteria = {match['lender_id']: [detail.criterion for detail in match['match_details']] for match in matches}
+
+    assert 'working_capital' not in criteria[1]
+    assert 'working_capital' in criteria[2]
+    # The unweighted rule does not change the score
+    assert [match['match_score'] for match in matches] == [100, 100]
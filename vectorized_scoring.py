@@ -0,0 +1,230 @@
+"""
+Columnar (NumPy) scoring for the BrokerBuddy matching engine.
+
+The requirements of a compiled ScoringPlan are laid out as one set of arrays
+per rule, so a client can be scored against the whole catalog with array
+comparisons and weighted sums, instead of one Python call per lender. Scores
+are identical to ScoringPlan.lender_score; match details are built separately, only
+for the lenders that are returned.
+"""
+
+from scoring_rules import OPERATOR_COST
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the engine falls back to the per-lender loop
+    np = None
+
+HAS_NUMPY = np is not None
+
+class TermMatrix:
+    """Boolean guideline x term matrix for a comma-separated guideline field.
+
+    A guideline accepts a client value when it accepts all values, or when any
+    of its terms is a substring of the client value.
+    """
+
+    def __init__(self, term_sets, accepts_all):
+        self.present = np.array([terms is not None for terms in term_sets], dtype=bool)
+        self.accepts_all = np.array(accepts_all, dtype=bool)
+        self.vocabulary = sorted({term for terms in term_sets if terms for term in terms})
+        positions = {term: i for i, term in enumerate(self.vocabulary)}
+
+        self.matrix = np.zeros((len(term_sets), len(self.vocabulary)), dtype=bool)
+        for row, terms in enumerate(term_sets):
+            if terms:
+                self.matrix[row, [positions[term] for term in terms]] = True
+
+        # Transposed float copy so many clients can be matched with one matmul
+        self.term_weights = self.matrix.T.astype(np.float32)
+
+    def _hits(self, client_value):
+        return np.fromiter((term in client_value for term in self.vocabulary), dtype=bool, count=len(self.vocabulary))
+
+    def accepts(self, client_value):
+        hits = self._hits(client_value)
+        if not hits.any():
+            return self.accepts_all.copy()
+        return self.accepts_all | self.matrix[:, hits].any(axis=1)
+
+    def accepts_many(self, client_values):
+        """Return a clients x guidelines acceptance matrix.
+
+        Rows for clients without a value (None) are all False.
+        """
+        hits = np.zeros((len(client_values), len(self.vocabulary)), dtype=np.float32)
+        seen = {}
+        for i, value in enumerate(client_values):
+            if value is None:
+                continue
+            if value not in seen:
+                seen[value] = self._hits(value)
+            hits[i] = seen[value]
+        accepted = (hits @ self.term_weights) > 0
+        accepted |= self.accepts_all
+        accepted[[value is None for value in client_values]] = False
+        return accepted
+
+class RuleColumn:
+    """Arrays for one scoring rule over every guideline row.
+
+    ``present`` flags the rows that set the rule's requirement; the other
+    arrays hold the compiled thresholds, with placeholders where absent.
+    """
+
+    def __init__(self, rule, thresholds):
+        self.rule = rule
+        self.present = np.array([threshold is not None for threshold in thresholds], dtype=bool)
+        if rule.operator == 'at_least':
+            self.minimum = np.array([threshold or 0 for threshold in thresholds], dtype=float)
+        elif rule.operator == 'between':
+            self.minimum = np.array([threshold[0] if threshold else 0 for threshold in thresholds], dtype=float)
+            self.maximum = np.array([threshold[1] if threshold else 0 for threshold in thresholds], dtype=float)
+        elif rule.operator == 'accepts_term':
+            self.terms = TermMatrix([threshold[0] if threshold else None for threshold in thresholds],
+                                    [threshold[1] if threshold else False for threshold in thresholds])
+        else:
+            self.accepted = np.array([threshold in rule.values for threshold in thresholds], dtype=bool)
+
+    def passes(self, value):
+        """Rows whose requirement a client value meets (ignoring ``present``)."""
+        operator = self.rule.operator
+        if operator == 'at_least':
+            return value >= self.minimum
+        if operator == 'between':
+            return (self.minimum <= value) & (value <= self.maximum)
+        if operator == 'accepts_term':
+            return self.terms.accepts(value)
+        return self.accepted
+
+    def passes_many(self, values):
+        """Clients x rows version of ``passes``; rows for a None value are unspecified."""
+        operator = self.rule.operator
+        if operator in ('at_least', 'between'):
+            values = np.array([value if value is not None else np.nan for value in values], dtype=float)[:, None]
+            if operator == 'at_least':
+                return values >= self.minimum
+            return (self.minimum <= values) & (values <= self.maximum)
+        if operator == 'accepts_term':
+            return self.terms.accepts_many(values)
+        return np.broadcast_to(self.accepted, (len(values), len(self.accepted)))
+
+class LenderColumns:
+    """Column arrays for every guideline row of a compiled ScoringPlan.
+
+    Guideline rows are stored contiguously per lender, in catalog order, so
+    per-lender results can be reduced with ``np.maximum.reduceat``.
+    """
+
+    def __init__(self, plan):
+        if not HAS_NUMPY:
+            raise RuntimeError("NumPy is required for vectorized scoring")
+
+        self.plan = plan
+        self.lenders = plan.lenders
+        counts = [len(lender.guidelines) for lender in self.lenders]
+        self.lender_starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+        self.rows = len(plan.guidelines)
+        self.columns = [RuleColumn(rule, thresholds) for rule, thresholds in zip(plan.rules, plan.thresholds)]
+        # (rule position, column) of the knockout rules, cheapest first
+        self.knockout_columns = sorted(
+            ((position, column) for position, column in enumerate(self.columns) if column.rule.knockout),
+            key=lambda item: OPERATOR_COST[item[1].rule.operator]
+        )
+
+    def __len__(self):
+        return len(self.lenders)
+
+    def knockouts(self, profiles):
+        """Find the guideline rows each ClientProfile is knocked out of.
+
+        Returns ``(knocked, reasons)``: a clients x rows mask of rows failing
+        a knockout rule, and a clients x lenders array holding the position
+        of the rule that knocked out each lender (from its first row), or -1
+        where the lender has a row left.
+        """
+        knocked = np.zeros((len(profiles), self.rows), dtype=bool)
+        first_failure = np.full((len(profiles), self.rows), -1, dtype=np.intp)
+        for position, column in self.knockout_columns:
+            values = [getattr(profile, column.rule.client_field) for profile in profiles]
+            provided = np.array([value is not None for value in values], dtype=bool)[:, None]
+            failed = provided & column.present & ~column.passes_many(values)
+            first_failure[failed & ~knocked] = position
+            knocked |= failed
+
+        if not len(self.lenders):
+            return knocked, np.zeros((len(profiles), 0), dtype=np.intp)
+        lender_knocked = np.logical_and.reduceat(knocked, self.lender_starts, axis=1)
+        reasons = np.where(lender_knocked, first_failure[:, self.lender_starts], -1)
+        return knocked, reasons
+
+    def score(self, profile, knocked=None):
+        """Score one ClientProfile against every lender.
+
+        Returns a float array with each lender's best score over its
+        guideline rows, or -1 where no criterion applied. Rows flagged in
+        ``knocked`` (see ``knockouts``) are left out.
+        """
+        earned = np.zeros(self.rows)
+        possible = np.zeros(self.rows)
+
+        for column in self.columns:
+            value = getattr(profile, column.rule.client_field)
+            if value is None:
+                continue
+            weight = column.rule.weight
+            possible += weight * column.present
+            earned += weight * (column.present & column.passes(value))
+
+        return self._reduce_scores(earned, possible, knocked)
+
+    def score_many(self, profiles, knocked=None):
+        """Score a batch of ClientProfiles against every lender at once.
+
+        Returns a clients x lenders array of best scores, leaving out the
+        clients x rows mask ``knocked`` if given.
+        """
+        earned = np.zeros((len(profiles), self.rows))
+        possible = np.zeros((len(profiles), self.rows))
+
+        for column in self.columns:
+            values = [getattr(profile, column.rule.client_field) for profile in profiles]
+            provided = np.array([value is not None for value in values], dtype=bool)[:, None]
+            applies = provided & column.present
+            weight = column.rule.weight
+            possible += weight * applies
+            earned += weight * (applies & column.passes_many(values))
+
+        return self._reduce_scores(earned, possible, knocked)
+
+    def _reduce_scores(self, earned, possible, knocked=None):
+        """Turn earned/possible points into each lender's best score."""
+        scored = possible > 0
+        if knocked is not None:
+            scored &= ~knocked
+        scores = np.full(earned.shape, -1.0)
+        scores[scored] = earned[scored] / possible[scored] * 100
+
+        if not len(self.lenders):
+            return scores
+        return np.maximum.reduceat(scores, self.lender_starts, axis=-1)
+
+def rank_lenders(scores, limit=None, min_score=0):
+    """Return lender positions with a positive score, best first.
+
+    Only scores of at least ``min_score`` are kept, and at most ``limit``
+    positions are returned, selected with a partition rather than a full
+    sort. Ties keep catalog order, as the stable sort in find_matching_lenders
+    does.
+    """
+    eligible = np.flatnonzero((scores > 0) & (scores >= min_score))
+    if limit is not None and len(eligible) > limit:
+        if limit <= 0:
+            return eligible[:0]
+        eligible_scores = scores[eligible]
+        cutoff = np.partition(eligible_scores, len(eligible) - limit)[len(eligible) - limit]
+        above = eligible[eligible_scores > cutoff]
+        # Fill the remaining places with the earliest lenders tied at the cutoff
+        tied = eligible[eligible_scores == cutoff][:limit - len(above)]
+        eligible = np.sort(np.concatenate((above, tied)))
+    return eligible[np.argsort(-scores[eligible], kind='stable')]
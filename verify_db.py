@@ -179,6 +179,7 @@ def verify_clients_table(conn):
         'equipment_cost': 'TEXT',
         'industry': 'TEXT',
         'notes': 'TEXT',
+        'interested_in_wc': 'TEXT',
         'created_at': 'TEXT',
         'updated_at': 'TEXT'
     }